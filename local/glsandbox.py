@@ -3,7 +3,6 @@ import sys
 import numpy as np
 from OpenGL.GL import *
 from OpenGL.GL import shaders
-from OpenGL.arrays import vbo
 from qtpy import QtWidgets
 from qtpy.QtWidgets import QApplication, QOpenGLWidget
 
@@ -31,19 +30,51 @@ vertex_data = np.array([-0.1, -0.1,  0.0,
 class glWidget(QOpenGLWidget):
     
     _handle: int = -1
+    vbo: int = -1
+    vao: int = -1
     
     def __init__(self, parent=None):
         QOpenGLWidget.__init__(self, parent)
         self.setMinimumSize(600, 600)
         
+        # CPU-side vertex data, and (start, stop) float ranges of it that
+        # changed since the last upload.
+        self._vertices = vertex_data.copy()
+        self._dirty_buffers = []
+        
+
+    def set_vertices(self, data, start=0):
+        """
+        Stage new vertex data. Nothing is sent to the GPU until the upload
+        phase at the start of the next frame.
+        """
+        stop = start + len(data)
+        self._vertices[start:stop] = data
+        self._dirty_buffers.append((start, stop))
+        self.update()
+        
+
 
     def initializeGL(self):
-        #self.vbo = vbo.VBO(vertex_data)
         self.create_program(vert_shader, frag_shader)
         glUseProgram(self._handle)
         
-        buffer = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, buffer)
+        # Upload vertex data once; it lives in GPU memory from here on, and
+        # later changes go through `_upload`.
+        self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, self._vertices.nbytes, self._vertices, GL_DYNAMIC_DRAW)
+        
+        # Record the attribute layout in a VAO so drawing is a single bind.
+        # Vertices are (x, y, z) triples, of which the shader reads (x, y).
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+        pos_loc = glGetAttribLocation(self._handle, "pos")
+        glVertexAttribPointer(pos_loc, 2, GL_FLOAT, GL_FALSE,
+                              3 * vertex_data.itemsize, ctypes.c_void_p(0))
+        glEnableVertexAttribArray(pos_loc)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
         
         glShadeModel(GL_SMOOTH)
         glMatrixMode(GL_PROJECTION)
@@ -79,13 +110,36 @@ class glWidget(QOpenGLWidget):
         glDeleteShader(frag_id)
         
         
+    def _upload(self):
+        """
+        Upload phase: copy every dirty range of staged vertex data into the
+        VBO through an unsynchronized mapping, so the driver never stalls
+        waiting on the GPU. Runs once per frame before any draw call.
+        """
+        if not self._dirty_buffers:
+            return
+        itemsize = self._vertices.itemsize
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        for start, stop in self._dirty_buffers:
+            n = stop - start
+            ptr = glMapBufferRange(GL_ARRAY_BUFFER,
+                                   start * itemsize,
+                                   n * itemsize,
+                                   GL_MAP_WRITE_BIT | GL_MAP_UNSYNCHRONIZED_BIT)
+            ptr = ctypes.cast(ptr, ctypes.POINTER(ctypes.c_float))
+            np.ctypeslib.as_array(ptr, shape=(n,))[:] = self._vertices[start:stop]
+            glUnmapBuffer(GL_ARRAY_BUFFER)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self._dirty_buffers.clear()
+
+
     def paintGL(self):
+        self._upload()
         glClearColor(0.1, 0.1, 0.1, 1.0)
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        glLoadIdentity()
-        self.vbo.bind()
         glUseProgram(self._handle)
-        glDrawArrays(GL_TRIANGLES, 0, len(vertex_data))
+        glBindVertexArray(self.vao)
+        glDrawArrays(GL_TRIANGLES, 0, len(self._vertices) // 3)
 
 
 
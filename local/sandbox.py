@@ -2,10 +2,31 @@ from pathlib import Path
 from types import SimpleNamespace
 import matplotlib.pyplot as plt
 import numpy as np
-from scipy.signal import find_peaks
+import scipy.fft
 
-data_file = Path(__file__).parent / "testing_data.npy"
-DATA = np.load(data_file, allow_pickle=True).item()
+try:
+    from microtune._yin_numba import cumulative_energy, diff_fn, local_minima
+except ImportError:
+    # numba isn't installed; plain numpy/scipy equivalents (much slower).
+    from scipy.signal import find_peaks
+
+    def diff_fn(x, W, out):
+        for tau in range(len(out)):
+            delta = x[:W] - x[tau:tau + W]
+            out[tau] = np.dot(delta, delta)
+
+    def cumulative_energy(x, W, out):
+        csum = np.cumsum(np.square(x, dtype=float))
+        out[0] = csum[W - 1]
+        out[1:] = csum[W:W + len(out) - 1] - csum[:len(out) - 1]
+
+    def local_minima(x, lo, hi, thresh, distance):
+        ixs, _ = find_peaks(-x, height=-thresh, distance=distance)
+        return ixs[(ixs >= lo) & (ixs <= hi)]
+
+# Arrays in the archive are only read (and decompressed) when accessed.
+data_file = Path(__file__).parent / "testing_data.npz"
+DATA = np.load(data_file)
 timestamps = DATA["timestamp"]
 pitches = DATA["pitch"]
 notes = DATA["note"]
@@ -17,7 +38,7 @@ self = SimpleNamespace()
 
 fig = plt.figure()
 ax = fig.add_subplot(1, 1, 1)
-dn = dns[-1]
+dn = np.ascontiguousarray(dns[-1], dtype=np.float32)
 
 #ax.plot(dn)
 
@@ -25,6 +46,31 @@ fs = 48000
 
 W = len(dn) // 2
 L = np.arange(W - 1)
-x = np.array([np.sum((dn[:W] - dn[tau:tau+W]**2)) for tau in L])
+x = np.empty(len(L), dtype=np.float32)
+energy = np.empty(len(L), dtype=np.float32)
+
+# Warm up (compile or load from cache) before timing anything.
+diff_fn(dn[:4], 2, x[:2])
+cumulative_energy(dn[:4], 2, energy[:2])
+
+# Difference function via d(tau) = r_0(0) + r_tau(0) - 2 * r(tau), where the
+# cross term is the correlation of `dn[:W]` against `dn`, computed with FFTs.
+# Float32 input keeps pocketfft in single precision, and `workers=-1`
+# lets it use all cores.
+n = scipy.fft.next_fast_len(len(dn), real=True)
+spec = scipy.fft.rfft(dn, n, workers=-1)
+spec *= np.conj(scipy.fft.rfft(dn[:W], n, workers=-1))
+acf = scipy.fft.irfft(spec, n, workers=-1)[:len(L)]
+cumulative_energy(dn, W, energy)
+x[:] = energy[0] + energy - 2 * acf
+
+# Direct O(W^2) kernel, kept for reference.
+x_direct = np.empty_like(x)
+diff_fn(dn, W, x_direct)
+print("max abs. deviation from direct:", np.max(np.abs(x - x_direct)))
+
+# Candidate periods.
+ixs = local_minima(x, 0, len(x) - 1, np.inf, 5)
 
-ax.plot(L, x)
\ No newline at end of file
+ax.plot(L, x)
+ax.plot(L[ixs], x[ixs], "o")
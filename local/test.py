@@ -1,5 +1,5 @@
-from collections import deque
 import logging
+from pathlib import Path
 import time
 import sys
 from typing import Optional
@@ -21,25 +21,41 @@ TESTING = True
 
 MAXBLOCKS = 10
 MAXVALUES = 1000
-BLOCK_ATTRS_TO_STORE = [
-    "timestamp",
-    "pitch",
-    "note",
-    "error",
-    "error_adj",
-    "rms",
-    "dn",
-]
+BLOCK_ATTRS_TO_STORE = {
+    "timestamp": np.float64,
+    "pitch": np.float32,
+    "note": np.int32,
+    "error": np.float32,
+    "error_adj": np.float32,
+    "rms": np.float32,
+    "dn": np.float32,
+}
 
 
 def store_block(block: Block):
+    global CURSOR
 
-    block.rms = np.sqrt(np.mean(block.data**2))
-    block.dn = block.dn
+    # Write into the preallocated ring of each attribute.
+    record_block(CURSOR % MAXVALUES, DATA, block)
     
-    BLOCKS.append(block)
-    for key in BLOCK_ATTRS_TO_STORE:
-        DATA[key].append(getattr(block, key))
+    BLOCK_DATA[CURSOR % MAXBLOCKS] = block.data
+    CURSOR += 1
+
+
+def record_block(i: int, data: dict, block: Block) -> None:
+    data["timestamp"][i] = block.timestamp
+    data["pitch"][i] = block.pitch
+    data["note"][i] = block.note
+    data["error"][i] = block.error
+    data["error_adj"][i] = block.error_adj
+    if block.dn is None:
+        # Blocks below the volume gate skip the estimator, which is what
+        # fills in `rms`.
+        data["rms"][i] = np.sqrt(np.dot(block.data, block.data) / len(block.data))
+        data["dn"][i] = np.nan
+    else:
+        data["rms"][i] = block.rms
+        data["dn"][i] = block.dn
     
 
 #--------------------------------------
@@ -58,10 +74,15 @@ drv = MainWindow(
 drv.intonation_widget.pitch_estimator = drv.pitch_estimator
 
 if TESTING:
-    DATA = {}
-    BLOCKS = deque(maxlen=MAXBLOCKS)
-    for name in BLOCK_ATTRS_TO_STORE:
-        DATA[name] = deque(maxlen=MAXVALUES)
+    # Rings for each attribute. `dn` has one value per lag (NaNs for blocks
+    # below the volume gate, which don't have one), and the raw data one
+    # per sample. If no blocks arrive, empty arrays are saved.
+    DATA = {key: np.empty(MAXVALUES, dtype=dtype)
+            for key, dtype in BLOCK_ATTRS_TO_STORE.items()}
+    DATA["dn"] = np.empty((MAXVALUES, len(drv.pitch_estimator.lags)),
+                          dtype=BLOCK_ATTRS_TO_STORE["dn"])
+    CURSOR = 0
+    BLOCK_DATA = np.empty((MAXBLOCKS, instream.bufsize), dtype=np.float32)
     drv.blockProcessed.connect(store_block)
 
 clock = Clock()
@@ -76,19 +97,24 @@ ie = drv.intonation_estimator
 
 if TESTING:        
     
+    # Unroll the rings into chronological order.
+    n_stored = min(CURSOR, MAXVALUES)
+    order = np.arange(CURSOR - n_stored, CURSOR) % MAXVALUES
     for key, val in DATA.items():
-        DATA[key] = np.array(val)
+        DATA[key] = val[order]
         
     timestamps = DATA["timestamp"]
     n_iters = len(timestamps)
-    dts = np.ediff1d(timestamps)
-    fps = 1 / np.mean(dts)
     print("Ran {} loops in {:.1f} secs".format(n_iters, t_tot))
-    print("FPS: {:.2f}".format(fps))
+    if n_iters > 1:
+        fps = 1 / np.mean(np.ediff1d(timestamps))
+        print("FPS: {:.2f}".format(fps))
             
-    data_arrays = np.array([b.data for b in BLOCKS])
-    DATA["data"] = data_arrays
-    data_file = Path(__file__).parent / "testing_data.npy"
-    np.save(data_file, DATA, allow_pickle=True)
+    n_stored = min(CURSOR, MAXBLOCKS)
+    order = np.arange(CURSOR - n_stored, CURSOR) % MAXBLOCKS
+    DATA["data"] = BLOCK_DATA[order]
+    data_file = Path(__file__).parent / "testing_data.npz"
+    np.savez_compressed(data_file, **DATA)
+
     
     
\ No newline at end of file
@@ -0,0 +1,154 @@
+"""
+Numba-compiled kernels for the YIN pitch-estimation pipeline.
+
+Kernels are compiled lazily on first call and cached to disk, so the first
+call in a fresh environment is slow. Callers should warm them up with a
+small input before entering a real-time loop.
+
+"""
+import math
+
+import numpy as np
+from numba import njit, prange
+
+
+__all__ = [
+    "cmndf",
+    "cumulative_energy",
+    "diff_fn",
+    "local_minima",
+    "normalize",
+]
+
+
+
+@njit(parallel=True, fastmath=True, cache=True)
+def diff_fn(x: np.ndarray, W: int, out: np.ndarray) -> None:
+    """
+    YIN difference function. Writes the squared difference between `x[:W]`
+    and `x[tau:tau + W]` into `out[tau]` for each lag `tau < len(out)`.
+
+    `x` must have at least `len(out) + W - 1` elements.
+    """
+    for tau in prange(len(out)):
+        s = 0.0
+        for i in range(W):
+            delta = x[i] - x[tau + i]
+            s += delta * delta
+        out[tau] = s
+
+
+
+@njit(cache=True)
+def cumulative_energy(x: np.ndarray, W: int, out: np.ndarray) -> None:
+    """
+    Energy of the sliding window `x[tau:tau + W]` for each lag `tau < len(out)`,
+    maintained as a running sum (one subtraction and one addition per lag).
+    """
+    s = 0.0
+    for i in range(W):
+        s += x[i] * x[i]
+    out[0] = s
+    for tau in range(1, len(out)):
+        s += x[tau + W - 1] * x[tau + W - 1] - x[tau - 1] * x[tau - 1]
+        out[tau] = s
+
+
+
+@njit(cache=True)
+def local_minima(x: np.ndarray,
+                 lo: int,
+                 hi: int,
+                 thresh: float,
+                 distance: int,
+                 ) -> np.ndarray:
+    """
+    Indices `i` in `[lo, hi]` of strict local minima of `x` with
+    `x[i] <= thresh`, in ascending order.
+    
+    Minima closer than `distance` samples to a deeper minimum are dropped,
+    as with `scipy.signal.find_peaks(-x, distance=distance)`.
+    """
+    lo = max(lo, 1)
+    hi = min(hi, len(x) - 2)
+    out = np.empty(max(hi - lo + 1, 0), dtype=np.int64)
+    k = 0
+    for i in range(lo, hi + 1):
+        if x[i] < x[i - 1] and x[i] < x[i + 1] and x[i] <= thresh:
+            out[k] = i
+            k += 1
+    out = out[:k]
+    if distance <= 1 or k < 2:
+        return out
+
+    # Visit minima from deepest to shallowest, suppressing shallower
+    # neighbors within `distance` of each one kept.
+    keep = np.ones(k, dtype=np.bool_)
+    for j in np.argsort(x[out]):
+        if not keep[j]:
+            continue
+        m = j - 1
+        while m >= 0 and out[j] - out[m] < distance:
+            keep[m] = False
+            m -= 1
+        m = j + 1
+        while m < k and out[m] - out[j] < distance:
+            keep[m] = False
+            m += 1
+    return out[keep]
+
+
+
+
+@njit(fastmath=True, cache=True)
+def cmndf(x: np.ndarray,
+          W: int,
+          acf: np.ndarray,
+          out_d: np.ndarray,
+          out_dn: np.ndarray,
+          ) -> float:
+    """
+    Fused YIN pre-pass. Given the cross term `acf[tau] = sum(x[:W] * x[tau:tau + W])`,
+    computes in a single sweep over the lags
+    
+     - the difference function `d(tau) = r_0(0) + r_tau(0) - 2 * acf[tau]`,
+       with the window energy `r_tau(0)` maintained as a running sum,
+     - its cumulative-mean normalization, and
+     - the RMS of `x`, which falls out of the same energy sums.
+    
+    Writes `d` and the normalized function into `out_d` and `out_dn`, and
+    returns the RMS.
+    """
+    r0 = 0.0
+    for i in range(W):
+        r0 += x[i] * x[i]
+    ssq = r0
+    for i in range(W, len(x)):
+        ssq += x[i] * x[i]
+
+    out_d[0] = 0.0
+    out_dn[0] = 1.0
+    r_tau = r0
+    d_sum = 0.0
+    for tau in range(1, len(out_d)):
+        r_tau += x[tau + W - 1] * x[tau + W - 1] - x[tau - 1] * x[tau - 1]
+        d = r0 + r_tau - 2.0 * acf[tau]
+        d_sum += d
+        out_d[tau] = d
+        out_dn[tau] = d * tau / d_sum if d_sum > 0.0 else 1.0
+
+    return math.sqrt(ssq / len(x))
+
+
+
+@njit(cache=True)
+def normalize(d: np.ndarray, out: np.ndarray) -> None:
+    """
+    Cumulative-mean normalization of the difference function `d`, i.e.,
+    `out[tau] = d[tau] * tau / sum(d[1:tau + 1])` with `out[0] = 1`.
+    """
+    out[0] = 1.0
+    d_sum = 0.0
+    for tau in range(1, len(d)):
+        d_sum += d[tau]
+        out[tau] = d[tau] * tau / d_sum if d_sum > 0.0 else 1.0
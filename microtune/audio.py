@@ -5,10 +5,12 @@ also defined here) that contain discrete chunks of audio data which are
 loaded into ``InputStream.q`` as well as sent to a callback function.
 
 """
+import functools
 import logging
 from numbers import Number
 import threading
 from typing import (    
+    Callable,
     Optional,
 )
 
@@ -25,6 +27,16 @@ __all__ = [
 
 
 
+@functools.lru_cache(maxsize=None)
+def _query_devices() -> sd.DeviceList:
+    """
+    List of all devices. Enumerating devices is slow, so this is only done
+    once per process.
+    """
+    return sd.query_devices()
+
+
+
 class InputStream:
 
     """
@@ -79,8 +91,16 @@ class InputStream:
     #: via `CircularBuffer.read()`.
     _buf: CircularBuffer
 
+    #: Cached `sd.query_devices(device)` result for the current device.
+    _device_info: dict
+
+    #: Called (with no arguments) on the audio thread after each write to
+    #: the buffer. Must return quickly and must not block.
+    callback: Optional[Callable[[], None]]
+
     #: Synchronization primitives.
     _lock: threading.Lock
+    _ready: threading.Event
 
 
 
@@ -99,18 +119,20 @@ class InputStream:
             info = sd.query_devices(kind="input")
             info = info if isinstance(info, dict) else info[-1]
             name = info["name"]
-            for i, d in enumerate(sd.query_devices()):
+            for i, d in enumerate(_query_devices()):
                 if d["name"] == name:
                     device = i
 
+        self._device_info = sd.query_devices(device)
         if not channels:
-            channels = sd.query_devices(device)["max_input_channels"]
+            channels = self._device_info["max_input_channels"]
 
         self._stream = sd.InputStream(
             device=device,
             channels=channels,
             samplerate=samplerate,
             blocksize=burstsize,
+            dtype="float32",
             callback=self._write,
         )
 
@@ -120,15 +142,16 @@ class InputStream:
                                    fill_value=0,
                                    dtype=self._stream.dtype)
 
+        self.callback = None
+
         # Thread-safety.
         self._lock = threading.Lock()
+        self._ready = threading.Event()
 
 
     @property
     def name(self) -> str:
-        info = sd.query_devices(device=self.device)
-        name = info["name"]
-        return name
+        return self._device_info["name"]
 
     @property
     def active(self) -> bool:
@@ -158,9 +181,12 @@ class InputStream:
 
     @bufsize.setter
     def bufsize(self, N: int) -> None:
+        # Only the buffer changes; the stream keeps running and its callback
+        # picks up the new buffer on its next write.
         with self._lock:
-            self._buf = CircularBuffer([N, self._stream.channels],
-                                       dtype=self._stream.dtype)                                         
+            self._buf = self._buf.resized(N)
+            if not self._buf.full:
+                self._ready.clear()
 
     @property
     def bufsecs(self) -> float:
@@ -243,6 +269,7 @@ class InputStream:
         with self._lock:
             self._stream.stop()
             self._buf.clear()
+            self._ready.clear()
             
 
 
@@ -256,10 +283,27 @@ class InputStream:
             self._stream.close()
 
 
+    @property
+    def ready(self) -> bool:
+        """Whether the buffer has been filled with live input since the
+        stream was started.
+        """
+        return self._ready.is_set()
+
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the buffer has been filled with live input. Returns
+        `False` if `timeout` (in seconds) expires first.
+        """
+        return self._ready.wait(timeout)
+
+
     def read(self) -> np.ndarray:
-        # Read contents of buffer as an array.
-        with self._lock:       
-            return self._buf.read()
+        # Read contents of buffer as an array. The buffer's single-consumer
+        # read is lock-free, and swapping `_buf` is a single assignment, so
+        # the stream lock is only needed by the control paths.
+        return self._buf.read()
         
 
     def _reinit(self, **kw) -> None:
@@ -273,6 +317,7 @@ class InputStream:
                 "blocksize" : self._stream.blocksize,
                 "channels" : self._stream.channels,
                 "samplerate" : self._stream.samplerate,
+                "dtype" : self._stream.dtype,
                 "callback" : self._write,
             }
             if "burstsize" in kw:
@@ -282,9 +327,12 @@ class InputStream:
             needs_start = self._stream.active
             self._stream.close()
             self._stream = sd.InputStream(**settings)
+            if "device" in kw:
+                self._device_info = sd.query_devices(self._stream.device)
             self._buf = CircularBuffer((self.bufsize, self._stream.channels),
                                        fill_value=0,
                                        dtype=self._stream.dtype)
+            self._ready.clear()
             if needs_start:
                 self._stream.start()
 
@@ -292,10 +340,16 @@ class InputStream:
 
     def _write(self, data: np.ndarray, *args) -> None:
         """
-        Callback called by sd.InputStream.
+        Callback called by sd.InputStream. Runs on the audio thread, so it
+        must not block; the buffer's write is lock-free.
         """
-        with self._lock:            
-            self._buf.write(data)
+        buf = self._buf
+        buf.write(data)
+        if not self._ready.is_set() and buf.full:
+            self._ready.set()
+        callback = self.callback
+        if callback is not None:
+            callback()
 
 
 
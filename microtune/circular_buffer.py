@@ -1,7 +1,9 @@
+import math
 from numbers import Number
 import threading
 from typing import (
     Any,
+    Callable,
     Optional,
     Tuple,
     Union,
@@ -20,10 +22,13 @@ __all__ = [
 class CircularBuffer:
     
     """
-    Thread-safe circular buffer with a numpy array-like interface.
+    Single-producer/single-consumer circular buffer with a numpy array-like
+    interface.
     
     Optimized for many writes relative to reads. Once the data is read,
     a cached numpy array is created which expires once a write has occurred.
+    The array returned by a read is owned by the buffer and is overwritten
+    by the next read following a write, so copy it if it must be kept.
     
     Unlike typical buffers used for I/O, reading does not consume data.
     
@@ -37,25 +42,55 @@ class CircularBuffer:
     is expensive when there are many small writes relative to the number
     of reads.
     
+    Storage capacity is `maxshape[0]` rounded up to a power of two so that
+    ring positions are computed with a bit mask rather than with branches
+    or modulo. Reads still return the most recent `maxshape[0]` elements.
+    
+    Writes and reads take no locks, so `write` is safe to call from a
+    real-time audio callback. The writer publishes a monotonic count of
+    elements written only after its data is in place, and the reader works
+    from a snapshot of that count. There must be at most one writing and
+    one reading thread. A read that overlaps a write may see part of
+    that write.
+    
     """
     
-    #: Underlying numpy array.
+    #: Underlying storage: one flat, contiguous array.
+    _flat: np.ndarray
+    
+    #: `_flat` viewed as `(capacity, *maxshape[1:])`.
     _arr: np.ndarray
     
+    #: Logical shape, i.e. the shape of a full read.
+    _maxshape: Tuple[int, ...]
+    
+    #: `capacity - 1`, where the capacity is a power of two.
+    _mask: int
+    
+    #: Number of flat elements per row (i.e., per element of the ring).
+    _stride: int
+    
     #: Padding/value. If `None`, no padding/filling is done (the default behavior).
     _fill_value: Optional[Any]
     
-    #: Indicates current read/write head.
-    _head: int
+    #: Total number of elements written since creation/clearing. The
+    #: read/write head and fullness are derived from it.
+    _count: int
     
-    #: Indicates whether buffer is at capacity.
-    _full: bool
+    #: Preallocated destination for reads that must unroll the ring, and
+    #: its flat view.
+    _read_out: np.ndarray
+    _read_flat: np.ndarray
     
-    #: Cached array from last read request. Staleness is implemented
-    #: by setting this to `None`.
+    #: Reader for the full-buffer case, specialized for this buffer's
+    #: storage and shape. Takes a write count, returns the unrolled array.
+    _read_full: Callable[[int], np.ndarray]
+
+    #: Cached array from last read request, and the count it was read at.
     _cached: Optional[np.ndarray]
+    _cached_count: int
 
-    #: Thread-safety
+    #: Guards control-plane operations (e.g., clearing) only.
     _lock: threading.Lock
     
     
@@ -66,35 +101,49 @@ class CircularBuffer:
                  ) -> None:
         
         
-        # Initialize underlying array.
+        # Initialize underlying array. Storage is flat so that reads and
+        # writes are plain contiguous copies regardless of `maxshape`.
+        maxshape = tuple(np.atleast_1d(maxshape).tolist())
+        capacity = 1 << max(maxshape[0] - 1, 0).bit_length()
+        size = capacity * int(np.prod(maxshape[1:]))
         self._fill_value = fill_value
         if self._fill_value is None:
-            self._arr = np.zeros(maxshape, dtype=dtype)
+            self._flat = np.zeros(size, dtype=dtype)
         else:
-            if np.isnan(self._fill_value) and np.issubdtype(dtype, np.integer):
+            if isinstance(self._fill_value, float) and \
+               math.isnan(self._fill_value) and \
+               np.issubdtype(dtype, np.integer):
                 raise TypeError("cannot pad integer arrays with NaNs")
-            self._arr = np.full(maxshape, self._fill_value, dtype=dtype)    
+            self._flat = np.full(size, self._fill_value, dtype=dtype)
+        self._arr = self._flat.reshape((capacity, *maxshape[1:]))
+        self._maxshape = maxshape
+        self._mask = capacity - 1
+        self._stride = int(np.prod(maxshape[1:]))
+        self._read_out = np.empty(maxshape, dtype=self._flat.dtype)
+        self._read_flat = self._read_out.reshape(-1)
+        self._read_full = self._make_full_reader()
         
         # Initialize state.
-        self._head = 0
-        self._full = False
+        self._count = 0
         
         # Initialize thread-safety and cacheing.
         self._lock = threading.Lock()
         self._cached = None
+        self._cached_count = -1
 
 
     @property
     def shape(self) -> Tuple[int, ...]:
         
-        if self._full or self._fill_value is not None:
-            return self._arr.shape
-        return (self._head, *self._arr.shape[1:])
+        count = self._count
+        if count >= self._maxshape[0] or self._fill_value is not None:
+            return self._maxshape
+        return (count, *self._maxshape[1:])
         
     
     @property
     def maxshape(self) -> Tuple[int, ...]:
-        return self._arr.shape
+        return self._maxshape
     
     
     @property
@@ -109,34 +158,55 @@ class CircularBuffer:
     
     @property
     def full(self) -> bool:
-        return self._full
+        return self._count >= self._maxshape[0]
     
     
     def read(self) -> np.ndarray:
         """
-        Thread-safe, cacheing read-interface.
+        Lock-free, cacheing read-interface (single consumer).
         """
-        with self._lock:
-            if self._cached is None:
-                self._cached = self._read()
-            return self._cached
+        count = self._count
+        if count != self._cached_count:
+            self._cached = self._read(count)
+            self._cached_count = count
+        return self._cached
         
         
     def write(self, block: np.ndarray) -> None:
         """
-        Thread-safe, cacheing write-interface.
+        Lock-free write-interface (single producer).
         """
-        with self._lock:
-            self._write(block)
-            self._cached = None
+        self._write(block)
     
     
     def append(self, val: Any) -> None:
         """
-        Append a single value to the buffer. Currently not-optimized, so it's
-        equivalent to `CircularBuffer.write((val,)`.
+        Append a single value (i.e., one row) to the buffer. Lock-free
+        (single producer).
         """
-        self.write((val,))
+        count = self._count
+        self._arr[count & self._mask] = val
+        self._count = count + 1
+        
+        
+    def resized(self, maxlen: int) -> "CircularBuffer":
+        """
+        Return a new buffer with capacity `maxlen` (along the first axis)
+        holding as much of this buffer's most recent data as fits.
+        
+        The new buffer is returned rather than swapping storage in place so
+        that a writer can be redirected to it with a single (atomic)
+        reference assignment.
+        """
+        out = CircularBuffer((maxlen, *self.maxshape[1:]),
+                             dtype=self.dtype,
+                             fill_value=self._fill_value)
+        count = self._count
+        if count >= self._maxshape[0]:
+            out.write(self._read(count))
+        else:
+            out.write(self._arr[:count])
+        return out
         
         
     def clear(self) -> None:
@@ -145,70 +215,89 @@ class CircularBuffer:
         """
         with self._lock:
             
-            if self._fill_value is None:
-                self._arr = np.zeros_like(self._arr)
-            else:
-                self._arr = np.full_like(self._arr, self._fill_value)
-            
-            self._head = 0
-            self._full = False
-            self._cached = None    
+            self._flat.fill(0 if self._fill_value is None else self._fill_value)
+            self._count = 0
+            self._cached = None
+            self._cached_count = -1
     
     
-    def _read(self) -> np.ndarray:
+    def _read(self, count: int) -> np.ndarray:
         
         """
-        Implements core reading logic.
+        Implements core reading logic for a snapshot of the write count.
         """
-                
+        
+        maxlen = self._maxshape[0]
+        
         # Read from full buffer.
-        if self._full:
-            if self._head == 0:   # - shortcut
-                return np.copy(self._arr)
-            return np.roll(self._arr, -self._head, axis=0)
+        if count >= maxlen:
+            return self._read_full(count)
 
-        # Read from partially-full buffer.
+        # Read from partially-full buffer. Nothing has wrapped yet, and
+        # unwritten elements still hold the fill value.
         if self._fill_value is None:
-            return self._arr[:self._head]
-        return self._arr.copy()
+            return self._arr[:count]
+        np.copyto(self._read_out, self._arr[:maxlen])
+        return self._read_out
             
     
 
+    def _make_full_reader(self) -> Callable[[int], np.ndarray]:
+        
+        """
+        Build the full-buffer reader. Everything but the write count is
+        fixed for the life of the buffer, so it is bound as closure locals
+        once instead of being looked up and recomputed on every read.
+        """
+        
+        flat, out, read_out = self._flat, self._read_flat, self._read_out
+        maxlen, stride, mask = self._maxshape[0], self._stride, self._mask
+        capacity, size = mask + 1, out.size
+        copyto = np.copyto
+        
+        def read_full(count: int) -> np.ndarray:
+            # Unroll the last `maxlen` elements into the output array with
+            # two copies (oldest segment first).
+            start = (count - maxlen) & mask
+            first = min(maxlen, capacity - start) * stride
+            a = start * stride
+            copyto(out[:first], flat[a:a + first])
+            copyto(out[first:], flat[:size - first])
+            return read_out
+        
+        return read_full
+    
+    
     def _write(self, block: np.ndarray) -> None:
         
         """
         Implements core writing logic.
         """       
         
+        block = np.asarray(block)
         blocklen = len(block)
-        maxlen = self._arr.shape[0]
+        capacity = self._mask + 1
+        stride = self._stride
+        count = self._count
         
-        # If length of the data to write is greater than or equal to the 
-        # buffer capacity, simply reinitialize the buffer with the 
-        # tail end of the block data.
-        if blocklen >= maxlen:
-            self._arr[:] = block[blocklen - maxlen:]
-            self._head = 0
-            self._full = True
-            return
+        # Only the tail end of a block at least as long as the storage
+        # survives, so skip writing the rest.
+        n = min(blocklen, capacity)
+        skip = blocklen - n
         
-        # If there's enough free space to write without reaching capacity,
-        # append it, and move the head.
-        free = maxlen - self._head
-        if blocklen <= free:
-            self._arr[self._head:self._head + blocklen] = block
-            self._head += blocklen
-            if self._head == maxlen:
-                self._head = 0
-                self._full = True
-            return
+        # Write the (at most) two contiguous segments, starting where the
+        # surviving data lands. Offsets are in flat elements.
+        start = (count + skip) & self._mask
+        first = min(n, capacity - start)
+        src = block[skip:].reshape(-1)
+        # Cast like slice assignment would (e.g., floats are truncated into
+        # an int buffer).
+        a, b = start * stride, first * stride
+        np.copyto(self._flat[a:a + b], src[:b], casting="unsafe")
+        np.copyto(self._flat[:src.size - b], src[b:], casting="unsafe")
         
-        # Write with wrap-around by doing two writes.
-        new_head = blocklen - free
-        self._arr[self._head:] = block[:free]
-        self._arr[:new_head] = block[free:free + new_head]
-        self._head = new_head
-        self._full  = True
+        # Publish the write.
+        self._count = count + blocklen
             
     
     def __array__(self) -> np.ndarray:
@@ -221,9 +310,9 @@ class CircularBuffer:
     
     def __len__(self) -> int:
         
-        if self._full or self._fill_value is not None:
-            return len(self._arr)
-        return self._head
+        if self._fill_value is not None:
+            return self._maxshape[0]
+        return min(self._count, self._maxshape[0])
 
 
     def __repr__(self) -> str:
@@ -276,4 +365,32 @@ def test_circular_buffer():
     
     a.write([3, 4, 5, 6])
     assert np.array_equal(a, np.array([2, 3, 4, 5, 6], dtype=float))
-    
\ No newline at end of file
+
+    # Test resizing keeps the most recent data.
+    a = CircularBuffer(5, fill_value=0)
+    a.write([0, 1, 2, 3, 4, 5, 6])
+    assert np.array_equal(a.resized(3), np.array([4, 5, 6]))
+    assert np.array_equal(a.resized(7), np.array([2, 3, 4, 5, 6, 0, 0]))
+
+    # Test non-float fill-values for integer buffers.
+    a = CircularBuffer(5, dtype=int, fill_value=0)
+    a.write([0, 1, 2])
+    assert np.array_equal(a, np.array([0, 1, 2, 0, 0]))
+    try:
+        CircularBuffer(5, dtype=int, fill_value=np.nan)
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("integer buffer accepted a NaN fill-value")
+    
+    # Test writing floats into an integer buffer (truncated, as with
+    # slice assignment).
+    a = CircularBuffer(4, dtype=int)
+    a.write([0.5, 1.7, 2.2, -3.9])
+    assert np.array_equal(a, np.array([0, 1, 2, -3]))
+    
+    # Test appending single values.
+    a = CircularBuffer(5)
+    for i in range(7):
+        a.append(i)
+    assert np.array_equal(a, np.array([2, 3, 4, 5, 6]))
@@ -1,9 +1,6 @@
 from numbers import Number
 from pathlib import Path
-from typing import (
-    Optional,
-    Union,
-)
+from typing import Union
 import numpy as np
 
 __all__ = [
@@ -62,29 +59,40 @@ class Block:
     
     """
     A chunk of audio input, typically the complete contents of an input buffer.
-    """
-    
-    _data: np.ndarray
-    _index: int
-    _timestamp: Number
-    _samplerate: Number
-    
-    # preprocessing
-    rms: float = 0.0
     
-    # pitch estimation
-    d: Optional[np.ndarray] = None
-    dn: Optional[np.ndarray] = None
-    ixs: Optional[np.ndarray] = None
-    tunable: bool = False
+    `data` is always a C-contiguous float32 array, and the arrays attached
+    during processing (`d`, `dn`) are plain ndarrays. Compiled kernels are
+    handed these arrays directly rather than the block itself.
     
-    ix_best = 0
-    pitch: float = -1.0
+    `data` may be a view of the input stream's read buffer, and `d` and `dn`
+    belong to the pitch estimator; all are overwritten when the next block is
+    read and processed. Call `detach` to keep a block around past that.
+    """
     
-    # intonation estimation
-    note: int = -1
-    error: float = 0.0
-    error_adj: float = 0.0
+    __slots__ = (
+        "_data",        # np.ndarray
+        "_index",       # int
+        "_timestamp",   # Number
+        "_samplerate",  # Number
+        
+        # preprocessing
+        "rms",          # float
+        
+        # pitch estimation
+        "d",            # Optional[np.ndarray]
+        "dn",           # Optional[np.ndarray]
+        "tunable",      # bool
+        "ix_best",      # int
+        "dn_score",     # float
+        "pitch",        # float
+        
+        # intonation estimation
+        "note",         # int
+        "error",        # float
+        "error_adj",    # float
+        "error_std",    # float
+        "n_errors",     # int
+    )
     
     
     def __init__(self,
@@ -94,10 +102,27 @@ class Block:
                  samplerate: float,
                  ):
         
-        self._data = data
+        # Downstream FFTs and kernels want contiguous single-precision input.
+        # This is a no-op for the mono float32 arrays the input stream yields.
+        self._data = np.ascontiguousarray(data, dtype=np.float32)
         self._index = index
         self._timestamp = timestamp
         self._samplerate = samplerate
+        
+        self.rms = 0.0
+        
+        self.d = None
+        self.dn = None
+        self.tunable = False
+        self.ix_best = 0
+        self.dn_score = 0.0
+        self.pitch = -1.0
+        
+        self.note = -1
+        self.error = 0.0
+        self.error_adj = 0.0
+        self.error_std = 0.0
+        self.n_errors = 0
     
     
     @property
@@ -118,6 +143,20 @@ class Block:
 
 
 
+    def detach(self) -> "Block":
+        """
+        Give the block its own copies of `data`, `d` and `dn`, so it stays
+        intact once the stream and estimator reuse their buffers. Returns
+        the block itself.
+        """
+        self._data = self._data.copy()
+        if self.d is not None:
+            self.d = self.d.copy()
+        if self.dn is not None:
+            self.dn = self.dn.copy()
+        return self
+
+
     def __repr__(self) -> str:
         
         s = f"<Block({self.index}): " + \
@@ -1,10 +1,9 @@
-import time
-from typing import Optional
+from typing import Callable, Optional
+import numpy as np
 from qtpy import QtGui
 from qtpy.QtCore import (
     Qt,
     Signal,
-    QTimer,
 )
 from qtpy.QtWidgets import (
     # main
@@ -66,14 +65,30 @@ class MainWindow(QMainWindow):
     block: Optional[Block]
     _block_counter: int
     _block_timer: Clock
+    _block_t0: float
+    _block_now: Callable[[], float]
     
     _processing: bool = False
     
+    #: Peak amplitude below which a block is treated as silence (-50 dBFS).
+    #: Silent blocks skip pitch estimation.
+    gate: float = 10 ** (-50 / 20)
+    
+    #: Number of consecutive silent blocks after which an ongoing note is
+    #: considered finished.
+    gate_hold: int = 10
+    _silent_blocks: int = 0
+    
+    #: Set by the audio thread when it has queued a call to `process`,
+    #: and cleared once that call runs.
+    _process_pending: bool = False
+    
     
     # Signals
     processingStarted = Signal()
     processingStopped = Signal()
     blockProcessed = Signal(object)
+    dataReady = Signal()
 
             
 
@@ -94,6 +109,11 @@ class MainWindow(QMainWindow):
         self._block_counter = 0
         self._block_timer = Clock(start=True)
         
+        # The clock is never stopped, so block timestamps are taken straight
+        # from its time source rather than through its state checks.
+        self._block_t0 = self._block_timer.t_start
+        self._block_now = self._block_timer.fn
+        
         # - Pitch Estimator
         self.pitch_estimator = PitchEstimator(self.instream.samplerate)
         
@@ -104,6 +124,12 @@ class MainWindow(QMainWindow):
         self.init_ui(instream_widget=instream_widget, pitch_widget=pitch_widget)
         self.show()
         
+        # Processing is driven by the input stream: its callback emits
+        # `dataReady` from the audio thread, and the queued connection
+        # runs `process` on this (the GUI) thread.
+        self.dataReady.connect(self.process, Qt.QueuedConnection)
+        self.instream.callback = self._on_audio
+        
 
 
     @property
@@ -135,8 +161,12 @@ class MainWindow(QMainWindow):
         if instream_widget:
             
             # - Input Stream Widget
-            self.instream_widget = InputWidget(self.instream, parent=self)
-            self.blockProcessed.connect(self.instream_widget.update_ui)
+            self.instream_widget = InputWidget(
+                self.instream,
+                parent=self,
+                estimator=self.pitch_estimator,
+            )
+            self.blockProcessed.connect(self.instream_widget.update_ui, Qt.QueuedConnection)
             group = QGroupBox()
             group.setLayout(self.instream_widget.layout())
             group.setTitle("Input")
@@ -146,7 +176,7 @@ class MainWindow(QMainWindow):
             
             # - Pitch Widget
             self.pitch_widget = PitchWidget(self.pitch_estimator, parent=self)
-            self.blockProcessed.connect(self.pitch_widget.update_ui)
+            self.blockProcessed.connect(self.pitch_widget.update_ui, Qt.QueuedConnection)
             group = QGroupBox()
             group.setLayout(self.pitch_widget.layout())
             group.setTitle("Pitch Estimator")
@@ -154,7 +184,7 @@ class MainWindow(QMainWindow):
                     
         # - Intonation Widget
         self.intonation_widget = IntonationWidget(self.intonation_estimator, parent=self)
-        self.blockProcessed.connect(self.intonation_widget.update_ui)
+        self.blockProcessed.connect(self.intonation_widget.update_ui, Qt.QueuedConnection)
         group = QGroupBox()
         group.setTitle("Tuner")
         group.setLayout(self.intonation_widget.layout())
@@ -171,24 +201,19 @@ class MainWindow(QMainWindow):
         
     def start(self) -> None:
         """
-        Create a timer that grabs data from the buffer.
+        Start processing blocks as audio arrives.
         """
         if self._processing:
             return
         
-        # Start input stream, and let it warm up long enough to fill the buffer.
+        # Start input stream. Blocks aren't processed until it has filled
+        # the buffer (see `process`), so there's no need to wait for it here.
         self.instream.start()
-        time.sleep(0.4)
         
         # Update labels, state variables.
         self._processing = True
         self.processingStarted.emit()
         
-        # Create and start the timer.
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.process)
-        self.timer.start(10)
-        
 
 
     def stop(self) -> None:
@@ -198,7 +223,6 @@ class MainWindow(QMainWindow):
         if not self._processing:
             return
         
-        self.timer.stop()
         self._processing = False
         self.processingStopped.emit()
     
@@ -214,14 +238,17 @@ class MainWindow(QMainWindow):
         
     def process(self) -> None:
         """
-        `self.timer.timeout` is connected to this method.
+        `self.dataReady` is connected to this method.
         
         Forces input to be mono, and handles optional resampling.
         Emits `audioChanged`.
                 
         """
         
-        if self._processing:
+        self._process_pending = False
+        
+        # Skip the partially-filled reads taken while the stream warms up.
+        if self._processing and self.instream.ready:
             
             # - create new block (including any preprocessing)
             # - estimate pitch
@@ -235,7 +262,7 @@ class MainWindow(QMainWindow):
             self.block = Block(
                 data,
                 index=self._block_counter,
-                timestamp=self._block_timer(),
+                timestamp=self._block_now() - self._block_t0,
                 samplerate=self.instream.samplerate,
             )
             self._block_counter += 1
@@ -243,14 +270,36 @@ class MainWindow(QMainWindow):
             # Check for 'volume' gate.
             if len(self.block.data) == 0:
                 return
-
-            # Estimate pitch.            
-            self.pitch_estimator.process(self.block)
+            
+            if np.abs(self.block.data).max() < self.gate:
+                # Nothing to tune. Leave the block untunable, and end any
+                # note in progress once the silence has lasted a while.
+                self._silent_blocks += 1
+                if self._silent_blocks == self.gate_hold and \
+                    self.pitch_estimator.onset_flag:
+                    self.pitch_estimator.offset(self.block.timestamp)
+            else:
+                # Estimate pitch.
+                self._silent_blocks = 0
+                self.pitch_estimator.process(self.block)
                         
             # Estimate intonation.            
             self.intonation_estimator.process(self.block)
 
-            self.blockProcessed.emit(self.block)
+            # Widgets draw the block later, by which time the stream and
+            # estimator buffers it points into have moved on.
+            self.blockProcessed.emit(self.block.detach())
+
+
+    def _on_audio(self) -> None:
+        """
+        Input stream callback (audio thread). Queues at most one call to
+        `process` at a time, so bursts that arrive while the GUI thread is
+        busy are folded into the next block instead of piling up.
+        """
+        if self._processing and not self._process_pending:
+            self._process_pending = True
+            self.dataReady.emit()
 
 
     #--------------------------------------------------------------------------#
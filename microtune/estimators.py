@@ -1,14 +1,19 @@
-from collections import deque
 import logging
+import math
 from numbers import Number
-from typing import Optional, Tuple
+from typing import Callable, Optional, Tuple
 import numpy as np
-import scipy.interpolate
-import scipy.signal
+import scipy.fft
 
+from .circular_buffer import CircularBuffer
 from .common import Block
 from .scales import Scale
 
+try:
+    from . import _yin_numba
+except ImportError:
+    _yin_numba = None
+
 
 __all__ = [
     "PitchEstimator",
@@ -17,7 +22,9 @@ __all__ = [
 
 
 class Peak:
-            
+    
+    __slots__ = ()
+    
     def __init__(self):
         pass
 
@@ -37,43 +44,54 @@ class PitchEstimator:
 
     """
         
-    # User-defined parameters for pitch detection.
-    _samplerate: Number
-    _fmin: Number    # cutoff for lowest frequency in restricted search range
-    _fmax: Number    # cutoff for highest frequency in restricted search range
-    min_thresh: Number
-    abs_thresh: Number
-    
-    
-    
-    interp_half_width: int = 10    # in lag units
-    interp_upsample_fac: int = 20
-    
-    # Computed attributes derived from user-defined attributes.    
-    _lags: np.ndarray
-    _lagmin: Number  # cutoff for highest frequency in restricted search range
-    _lagmax: Number  # cutoff for lowest frequency in restricted search range
-    
-    history: dict
+    __slots__ = (
+        # User-defined parameters for pitch detection.
+        "_samplerate",      # Number
+        "_fmin",            # Number; cutoff for lowest frequency in restricted search range
+        "_fmax",            # Number; cutoff for highest frequency in restricted search range
+        "min_thresh",       # Number
+        "abs_thresh",       # Number
+        "method",           # str; "fft" or "direct"
+        
+        # Sub-sample refinement of the best lag: "parabolic" fits a parabola
+        # through the minimum and its neighbors, "spline" searches a quadratic
+        # spline upsampled around it.
+        "interp_mode",          # str
+        "interp_half_width",    # int; in lag units (spline only)
+        "interp_upsample_fac",  # int; (spline only)
+        
+        # Computed attributes derived from user-defined attributes.
+        "_lags",            # np.ndarray
+        "_cutoff",          # np.ndarray; [lagmin, lagmax] of restricted search range
+        "_dtype",           # type
+        "_d",               # np.ndarray
+        "_dn",              # np.ndarray
+        "_d_sum",           # np.ndarray
+        "_work",            # Optional[np.ndarray]
+        "_fft_len",         # Dict[Tuple[int, int], int]
+        "process",          # Callable[[Block], None]; see `_make_process`
+        
+        "history",          # Dict[str, CircularBuffer]
+        
+        "onset_flag",       # bool; true when onset has been found and pitch detection in progress
+        "onset_ix",         # int
+        "onset_t",          # float
+        "offset_t",         # float
+        
+        "onset_thresh",     # float
+        "offset_thresh",    # float
+        "offset_thresh_2",  # float
+        "integer_thresh",   # float
+    )
     
-    # Keep for plotting.
-    dn: np.ndarray
+    _history_attrs = {
+        "ix_best" : int,
+        "dn_score" : float,
+        "pitch" : float,
+    }
 
-    onset_flag: bool = False  # true when onset has been found and pitch detection in progress
-    onset_ix: int = 0
-    onset_t: float = 0.0
-    offset_t: float = 0.0
-    
-    onset_thresh = 0.15
-    offset_thresh = 0.35
-    offset_thresh_2 = 0.45
-    integer_thresh = 0.1
-    
-    _history_attrs = (
-        "ix_best",
-        "dn_score",
-        "pitch",
-    )
+    #: Methods whose compiled kernels have been run once in this process.
+    _warm_methods = set()
 
     def __init__(self,
                  samplerate: float,
@@ -82,6 +100,7 @@ class PitchEstimator:
                  min_thresh: float = 0.3,
                  abs_thresh: float = 0.1,
                  histlen: int = 20,
+                 method: str = "fft",
                  ):
                 
         # Store user-defined parameters.
@@ -90,10 +109,30 @@ class PitchEstimator:
         self._fmax = fmax
         self.min_thresh = min_thresh
         self.abs_thresh = abs_thresh     
+        if method not in ("fft", "direct"):
+            raise ValueError(f"unknown difference function method: {method}")
+        self.method = method
+        
+        self.interp_mode = "parabolic"
+        self.interp_half_width = 10
+        self.interp_upsample_fac = 20
+        
+        self.onset_flag = False
+        self.onset_ix = 0
+        self.onset_t = 0.0
+        self.offset_t = 0.0
+        
+        self.onset_thresh = 0.15
+        self.offset_thresh = 0.35
+        self.offset_thresh_2 = 0.45
+        self.integer_thresh = 0.1
 
         self.history = {}
-        for name in self._history_attrs:
-            self.history[name] = deque(maxlen=histlen)
+        for name, dtype in self._history_attrs.items():
+            self.history[name] = CircularBuffer(histlen, dtype=dtype)
+
+        # FFT length for the correlation, keyed by block length.
+        self._fft_len = {}
                 
         
         self.init()
@@ -116,6 +155,13 @@ class PitchEstimator:
     def lags(self) -> np.ndarray:
         return self._lags
 
+    @property
+    def min_blocksize(self) -> int:
+        """
+        Blocks at least this long can be processed with the current lags.
+        """
+        return 2 * len(self._lags)
+
 
 
     """
@@ -132,69 +178,252 @@ class PitchEstimator:
          - self._weights # Normalization coefficients for preliminary search area.
          - self._lagmin  # Shortest lag in restricted search area.
          - self._lagmax  # Longest lag in restricted search area.
+         - self._dtype   # Working precision of the difference function.
+         - self._d, self._dn, self._d_sum  # Output buffers, one entry per lag.
+         - self.process  # Block processor specialized for the above.
 
         """
         fs = self._samplerate
         fmin, fmax = self._fmin, self._fmax
 
-        # Computation is on lags up to 40 Hz.
-        self._lags = np.arange(int(np.ceil(fs / 40.0)), dtype=int)
-
         # Search range for valid pitches.
         self._cutoff = np.array([int(np.floor(fs / fmax)),
                                  int(np.ceil(fs / fmin))])
+
+        # Computation is on lags up to the longest one searched, plus enough
+        # room to interpolate around it.
+        n_lags = self._cutoff[1] + self.interp_half_width + 1
+        self._lags = np.arange(n_lags, dtype=int)
+        
+        # Reused by every block. Scratch space sized to the block itself is
+        # allocated on first use (see `_workspace`).
+        # Single precision is plenty for picking lags, and halves the memory
+        # traffic. Energy sums are still accumulated in double precision.
+        self._dtype = np.float32
+        self._d = np.empty(n_lags, dtype=self._dtype)
+        self._dn = np.empty(n_lags, dtype=self._dtype)
+        self._d_sum = np.empty(n_lags, dtype=self._dtype)
+        self._work = None
+        
+        self.process = self._make_process()
+        self._warm_up()
         
 
                 
         
 
-    def process(self, block: Block) -> None:
+    def _warm_up(self) -> None:
         """
-        Use YIN error coefficients to estimate pitch.
-        
-        Modifies
-         - block
-         
-         
-        Note:
+        Run the compiled kernels once on a silent block, so they're compiled
+        (or loaded from numba's cache) here rather than on the first real
+        block, which would stall the GUI thread for seconds. Only the kernels
+        `method` uses are run, and each only once per process.
+        """
+        warm = PitchEstimator._warm_methods
+        if _yin_numba is None or self.method in warm:
+            return
+        data = np.zeros(2 * len(self._lags) + 2, dtype=np.float32)
+        W = len(data) // 2 - 1
+        d, dn = self._d, self._dn
+        if self.method == "direct":
+            _yin_numba.diff_fn(data, W, d)
+            _yin_numba.normalize(d, dn)
+        else:
+            acf = self.compute_acf(data, W, len(self._lags))
+            _yin_numba.cmndf(data, W, acf, d, dn)
+        if not warm:
+            self.find_minima(dn, self.min_thresh)
+            self.find_minima(dn)
+        warm.add(self.method)
+
 
-        - Peak indices are off from lag values by 1 (`self._lags[ix] = ix + 1`).
+    def _make_process(self) -> Callable[[Block], None]:
+        """
+        Build `process` for the current lag set. The collaborators it calls
+        are bound as closure locals, so they aren't looked up on every block.
+        `init` rebuilds it whenever the lags change.
         
+        Thresholds and other public settings are still read through `self`
+        (from the helpers), so they can be changed at any time.
         """
+        compute_cmndf = self.compute_cmndf
+        select_lag = self.select_lag_0
+        peak_to_pitch = self.peak_to_pitch
+        push_ix_best = self.history["ix_best"].append
+        push_dn_score = self.history["dn_score"].append
+        push_pitch = self.history["pitch"].append
+        min_blocksize = self.min_blocksize
+        
+        def process(block: Block) -> None:
+            """
+            Use YIN error coefficients to estimate pitch.
+            
+            Modifies
+             - block
+             
+             
+            Note:
 
-        # Computed cumulative mean difference function and normalize it.
-        # Keep a copy of the non-normalized version since we'll use it
-        # during the interpolation stage.
-        # - difference function
-        data = block.data
-        W = len(data) // 2 - 1
+            - Peak indices are off from lag values by 1 (`self._lags[ix] = ix + 1`).
+            
+            """
+
+            # Lowering fmin can leave the stream's buffer too short for the
+            # new lags. Such blocks are left untunable (like those below the
+            # volume gate) until the buffer is made longer.
+            if len(block.data) < min_blocksize:
+                logging.debug("PitchEstimator: block shorter than %d samples",
+                              min_blocksize)
+                return
+
+            # Computed cumulative mean difference function and normalize it.
+            # Keep a copy of the non-normalized version since we'll use it
+            # during the interpolation stage.
+            d, dn, rms = compute_cmndf(block.data)
+            
+            block.rms = rms
+            block.d = d
+            block.dn = dn
+
+            #self.select_lag_yin(block)
+            select_lag(block)
+            
+            if not block.tunable:
+                return
+            
+            ix_best = block.ix_best
+            pitch = peak_to_pitch(d, ix_best)
+            dn_score = dn[ix_best]
+            
+            # Update state variables.
+            push_ix_best(ix_best)
+            push_dn_score(dn_score)
+            push_pitch(pitch)
+            
+            # Update block.
+            block.pitch = pitch
+            block.dn_score = dn_score
+            
+            #if len(self.history["ix_best"]) < 5:
+             #   block.tunable = False
         
-        d = np.array([np.sum((data[:W] - data[tau:tau+W])**2) for tau in self._lags])
-        dn = np.ones_like(d)
-        dn[1:] = d[1:] * self._lags[1:] / np.cumsum(d)[1:]
+        return process
         
-        block.d = d
-        block.dn = dn
-
-        #self.select_lag_yin(block)
-        self.select_lag_0(block)
         
-        if not block.tunable:
-            return
+    def compute_cmndf(self, data: np.ndarray) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Compute the YIN difference function `d`, its cumulative-mean
+        normalization `dn`, and the RMS of `data`.
         
-        ix_best = block.ix_best
-        pitch = self.peak_to_pitch(d, ix_best)
-        dn_score = dn[ix_best]
+        Uses d(tau) = r_0(0) + r_tau(0) - 2 * r(tau), where r_tau(0) is the
+        energy of `data[tau:tau + W]` and r(tau) is the correlation of
+        `data[:W]` with `data[tau:tau + W]`.
         
-        # Update state variables.
-        self.append_history(ix_best=ix_best, pitch=pitch, dn_score=dn_score)
+        `d` and `dn` are the estimator's own buffers and are overwritten by
+        the next call. Copy them if they need to outlive the block.
+        """
+        W = len(data) // 2 - 1
+        n_lags = len(self._lags)
+        if len(data) < W + n_lags - 1:
+            raise ValueError(f"block of length {len(data)} too short for {n_lags} lags")
+        d, dn = self._d, self._dn
+        if self.method == "direct":
+            return self.compute_cmndf_direct(data, W, d, dn)
+        
+        acf = self.compute_acf(data, W, n_lags)
+        
+        # The remaining passes are fused into one when compiled.
+        if _yin_numba is not None:
+            rms = _yin_numba.cmndf(data, W, acf, d, dn)
+            return d, dn, rms
+        
+        # Window energies r_tau(0) from a cumulative sum of squares,
+        # assembled in `d`.
+        csum = self._workspace(len(data))
+        np.square(data, out=csum, dtype=float)
+        np.cumsum(csum, out=csum)
+        d[:] = csum[W - 1:W - 1 + n_lags]
+        d[1:] -= csum[:n_lags - 1]
+        d += d[0]
+        acf *= 2
+        d -= acf
+        d[0] = 0.0
+        self._normalize(d, dn)
+        rms = np.sqrt(csum[-1] / len(data))
+        return d, dn, rms
+        
+        
+    def compute_cmndf_direct(self,
+                             data: np.ndarray,
+                             W: int,
+                             d: np.ndarray,
+                             dn: np.ndarray,
+                             ) -> Tuple[np.ndarray, np.ndarray, float]:
+        """
+        Same as `compute_cmndf`, but sums the squared differences for each lag
+        directly rather than going through the correlation. O(W * L), but
+        exact, and spread across cores when compiled.
+        """
+        if _yin_numba is not None:
+            _yin_numba.diff_fn(data, W, d)
+            _yin_numba.normalize(d, dn)
+        else:
+            # One reused difference buffer; the loop body only creates the
+            # lagged view.
+            tmp = self._workspace(len(data))[:W]
+            head = data[:W]
+            subtract, dot = np.subtract, np.dot
+            for tau in range(len(d)):
+                subtract(head, data[tau:tau + W], out=tmp, dtype=float)
+                d[tau] = dot(tmp, tmp)
+            self._normalize(d, dn)
+        rms = np.sqrt(np.dot(data, data) / len(data))
+        return d, dn, rms
+    
+    
+    def _normalize(self, d: np.ndarray, dn: np.ndarray) -> None:
+        """
+        Cumulative-mean normalization of `d` into `dn` (numpy version of
+        `_yin_numba.normalize`).
+        """
+        d_sum = self._d_sum
+        np.cumsum(d, out=d_sum)
+        np.multiply(d, self._lags, out=dn)
+        np.divide(dn, d_sum, out=dn, where=d_sum > 0)
+        np.copyto(dn, 1.0, where=d_sum <= 0)
         
-        # Update block.
-        block.pitch = pitch
-        block.dn_score = dn_score
+    
+    def _workspace(self, n: int) -> np.ndarray:
+        """
+        Scratch array of `n` doubles, reallocated only when the block
+        length changes. Kept in double precision because it holds running
+        sums that are differenced.
+        """
+        if self._work is None or len(self._work) != n:
+            self._work = np.empty(n)
+        return self._work
+        
+    
+    def compute_acf(self, data: np.ndarray, W: int, n_lags: int) -> np.ndarray:
+        """
+        Correlation of `data[:W]` with `data[tau:tau + W]` for `tau < n_lags`,
+        computed in the frequency domain.
         
-        #if len(self.history["ix_best"]) < 5:
-         #   block.tunable = False
+        The transform only needs to be long enough that the lags of interest
+        don't wrap around, i.e., at least `W + n_lags - 1` points.
+        """
+        # Keyed on the lag count too, since `init` changes it.
+        key = (len(data), n_lags)
+        n_fft = self._fft_len.get(key)
+        if n_fft is None:
+            n_fft = self._fft_len[key] = scipy.fft.next_fast_len(W + n_lags - 1, real=True)
+        # scipy's pocketfft keeps single precision regardless of the numpy
+        # version. The spectra are temporaries, so they're combined in place
+        # and the inverse may overwrite its input.
+        X = scipy.fft.rfft(data[:W + n_lags - 1].astype(self._dtype, copy=False), n_fft)
+        Y = scipy.fft.rfft(data[:W].astype(self._dtype, copy=False), n_fft)
+        X *= np.conjugate(Y, out=Y)
+        return scipy.fft.irfft(X, n_fft, overwrite_x=True)[:n_lags]
         
         
     def find_minima(self, 
@@ -203,12 +432,31 @@ class PitchEstimator:
                     ) -> np.ndarray:
         
         # Find minima in normalized difference function within search range.
-        ixs, _ = scipy.signal.find_peaks(-dn, distance=5)
         lagmin, lagmax = self._cutoff
-        ixs = ixs[(ixs >= lagmin) & (ixs <= lagmax)]
+        if _yin_numba is not None:
+            thresh = np.inf if height is None else height
+            return _yin_numba.local_minima(dn, lagmin, lagmax, thresh, 5)
+        
+        # Strict local minima within the search range.
+        lo = max(lagmin, 1)
+        hi = min(lagmax, len(dn) - 2)
+        mid = dn[lo:hi + 1]
+        mask = (mid < dn[lo - 1:hi]) & (mid < dn[lo + 1:hi + 2])
         if height is not None:
-            ixs = ixs[dn[ixs] <= height]
-        return ixs
+            mask &= mid <= height
+        ixs = np.flatnonzero(mask) + lo
+        if len(ixs) < 2:
+            return ixs
+        
+        # Keep the deepest minima, dropping shallower ones within 5 lags
+        # of one already kept.
+        keep = np.ones(len(ixs), dtype=bool)
+        for j in np.argsort(dn[ixs], kind="stable"):
+            if keep[j]:
+                near = np.abs(ixs - ixs[j]) < 5
+                near[j] = False
+                keep[near] = False
+        return ixs[keep]
     
     
     def upsample_peak(self,
@@ -219,6 +467,8 @@ class PitchEstimator:
         Returns upsampled array of lags and difference function around
         the `ix`th index.
         """
+        import scipy.interpolate
+        
         hw = self.interp_half_width
         lower = max(0, ix - hw)
         upper = min(ix + hw + 1, len(self._lags))
@@ -235,10 +485,20 @@ class PitchEstimator:
     def peak_to_pitch(self,
                       d: np.ndarray,
                       ix: int,
-                      ) -> Tuple[float, float]:
-        
-        X, Y = self.upsample_peak(d, ix)
-        lag = X[np.argmin(Y)]
+                      ) -> float:
+        
+        if self.interp_mode == "spline":
+            X, Y = self.upsample_peak(d, ix)
+            lag = X[np.argmin(Y)]
+            return self._samplerate / lag
+        
+        # Vertex of the parabola through d[ix - 1], d[ix], d[ix + 1].
+        lag = float(ix)
+        if 0 < ix < len(d) - 1:
+            a, b, c = d[ix - 1], d[ix], d[ix + 1]
+            denom = a - 2 * b + c
+            if denom > 0:
+                lag += 0.5 * (a - c) / denom
         return self._samplerate / lag
         
 
@@ -355,39 +615,67 @@ class PitchEstimator:
     
 class IntonationEstimator:
 
-    #: Associated tuning system/scale.
-    _scale: Optional[Scale] = None
-    
-    # State
-    note: int
-    note_buf: deque
-    
-    error: float
-    error_buf: deque
-    
-    error_adj: float
-    error_adj_buf: deque
+    __slots__ = (
+        # Associated tuning system/scale, and the tuning note.
+        "_scale",           # Scale
+        "_tn_note",         # int
+        "_tn_pitch",        # float
+        "_tn_cents",        # float
+        
+        # State
+        "note",             # int
+        "note_buf",         # CircularBuffer
+        "error",            # float
+        "error_adj",        # float
+        "error_adj_buf",    # CircularBuffer
+        
+        # Recent errors (see `error_buf`) and their running sum.
+        "_err_ring",        # np.ndarray
+        "_err_sum",         # float
+        "_err_head",        # int
+        "_err_count",       # int
+        
+        "process",          # Callable[[Block], None]; see `_make_process`
+    )
     
     def __init__(self,                 
                  histlen: int = 20,
                  ):
         
         self.note = 0    
-        self.note_buf = deque(maxlen=histlen)
+        self.note_buf = CircularBuffer(histlen, dtype=int)
         
+        # Errors are kept in a plain ring with a running sum, so the mean
+        # is O(1). `error_buf` presents them in order.
         self.error = 0.0
-        self.error_buf = deque(maxlen=histlen)
+        self._err_ring = np.zeros(histlen)
+        self._err_sum = 0.0
+        self._err_head = 0
+        self._err_count = 0
         
         self.error_adj = 0.0
-        self.error_adj_buf = deque(maxlen=histlen)
+        self.error_adj_buf = CircularBuffer(histlen, dtype=float)
         
         # Initialize default scale and tuning note.
         self._scale = Scale.from_file("EDO12")
         self._tn_note = 9
         self._tn_pitch = 440.0
+        self._specialize()
 
             
 
+    @property
+    def error_buf(self) -> np.ndarray:
+        """
+        Errors since the current note was first detected (at most `histlen`),
+        oldest first.
+        """
+        ring, head, count = self._err_ring, self._err_head, self._err_count
+        if count < len(ring):
+            return ring[:count]
+        return np.concatenate((ring[head:], ring[:head]))
+
+
     @property
     def scale(self) -> Scale:
         """
@@ -398,7 +686,20 @@ class IntonationEstimator:
 
     @scale.setter
     def scale(self, obj: Scale) -> None:
-        self._scale = obj
+        self.set_scale(obj)
+
+
+    def set_scale(self, scale: Scale, tn_note: Optional[int] = None) -> None:
+        """
+        Set the scale and tuning note together. If `tn_note` isn't given, the
+        current tuning note is kept if the new scale has it, and reset to the
+        first note otherwise.
+        """
+        if tn_note is None:
+            tn_note = self._tn_note if self._tn_note < len(scale) else 0
+        self._scale = scale
+        self._tn_note = tn_note
+        self._specialize()
         
 
 
@@ -413,6 +714,7 @@ class IntonationEstimator:
     @tn_note.setter
     def tn_note(self, index: int) -> None:
         self._tn_note = index
+        self._specialize()
         
 
 
@@ -427,6 +729,14 @@ class IntonationEstimator:
     @tn_pitch.setter
     def tn_pitch(self, freq: float) -> None:
         self._tn_pitch = freq
+        self._specialize()
+        
+    
+    def _specialize(self) -> None:
+        # Cents of the tuning note above the tonic, looked up once per
+        # change of scale or tuning note rather than every block.
+        self._tn_cents = float(self._scale.cents[self._tn_note])
+        self.process = self._make_process()
         
     
         
@@ -439,72 +749,132 @@ class IntonationEstimator:
     """
 
 
-    def process(self, block: Block) -> None:
+    def _make_process(self) -> Callable[[Block], None]:
         """
-        Find the note nearest to the estimated pitch (if any) and compute
-        cents error.
-        
-        Modifies:
-         - block
-         - self
-         
+        Build `process` for the current scale and tuning note. These are
+        bound as closure locals, and the property setters rebuild `process`
+        whenever they change.
         """
-        if not block.tunable:            
-            self.note = -1
-            self.note_buf.clear()
-            
-            self.error = 0.0
-            self.error_buf.clear()
+        nearest = self._scale.nearest
+        step = self._scale.uniform_step
+        n_notes = len(self._scale)
+        tn_cents: float = self._tn_cents
+        tn_pitch: float = self._tn_pitch
+        log2 = math.log2
+        push_note = self.note_buf.append
+        push_error = self._push_error
+        push_error_adj = self.error_adj_buf.append
+        
+        def process(block: Block) -> None:
+            """
+            Find the note nearest to the estimated pitch (if any) and compute
+            cents error.
             
-            self.error_adj = 0.0
-            self.error_adj_buf.clear()
-
-            block.note = -1
-            block.error = 0.0
-            block.error_adj = 0.0
+            Modifies:
+             - block
+             - self
+             
+            """
+            if not block.tunable:
+                # State only needs resetting on the first untunable block.
+                if self.note != -1:
+                    self.note = -1
+                    self.note_buf.clear()
+                
+                    self.error = 0.0
+                    self._clear_errors()
+                
+                    self.error_adj = 0.0
+                    self.error_adj_buf.clear()
+
+                block.note = -1
+                block.error = 0.0
+                block.error_adj = 0.0
+                block.error_std = 0.0
+                block.n_errors = 0
             
-            return
-        
-        scale = self._scale        
-        tn_note: int = self._tn_note
-        tn_cents: float = scale.cents[tn_note]
-        tn_pitch: float = self._tn_pitch
-        
-        # Get the distance from the tonic to the pitch (in cents). Value will be in
-        # [0, 1200) to match the scale note specification format.
-        dist_from_tn = 1200 * np.log2(block.pitch / tn_pitch)
-        dist_from_tonic = dist_from_tn + tn_cents
-        dist_from_tonic = np.mod(dist_from_tonic, 1200)
-        
-        # Find scale note closest to the given pitch.
-        scale = self._scale
-        
-        note = np.argmin(np.abs(dist_from_tonic - scale.cents))
-        if note == len(scale) - 1 and \
-            np.abs(dist_from_tonic - 1200) < np.abs(dist_from_tonic - scale.cents[-1]):
-            note = 0
-            error = dist_from_tonic - 1200
-        else:            
-            error = dist_from_tonic - scale.cents[note]
-        
-        # If this scale note is different from the last, clear history.
-        if len(self.note_buf) > 0 and self.note_buf[-1] != note:            
-            self.note_buf.clear()
-            self.error_buf.clear()
-            self.error_adj_buf.clear()
+                return
+        
+            # Get the distance from the tonic to the pitch (in cents).
+            # Scalar math; numpy ufuncs on Python floats are much slower.
+            dist_from_tonic = 1200 * log2(block.pitch / tn_pitch) + tn_cents
+        
+            # Find scale note closest to the given pitch.
+            if step is not None:
+                # Equal steps spanning the octave: the nearest step is the
+                # nearest note, and wrapping to the octave is a modulus on
+                # the step count.
+                k = round(dist_from_tonic / step)
+                note = k % n_notes
+                error = dist_from_tonic - k * step
+            else:
+                # Wrap into [0, 1200) to match the scale note specification format.
+                note, error = nearest(dist_from_tonic % 1200)
+        
+            # If this scale note is different from the last, clear history.
+            # (`self.note` is the last note appended while `note_buf` is non-empty.)
+            if len(self.note_buf) > 0 and self.note != note:
+                self.note_buf.clear()
+                self.error_adj_buf.clear()
+                self._clear_errors()
                     
-        self.note_buf.append(note)
-        self.error_buf.append(error)
-        
-        # Use contents of buffer to make estimates.
-        arr = np.array(self.error_buf)              
-        error_adj = np.mean(arr)
+            push_note(note)
+            push_error(error)
+        
+            # Use contents of buffer to make estimates.
+            error_adj = self._err_sum / self._err_count
+        
+            self.note = note
+            self.error = error
+            self.error_adj = error_adj
+            push_error_adj(error_adj)
+        
+            block.note = note
+            block.error = error
+            block.error_adj = error_adj
+            # Spread of the errors behind `error_adj` (order doesn't matter,
+            # so the ring's filled part is used as is).
+            n_errors = self._err_count
+            block.error_std = float(self._err_ring[:n_errors].std())
+            block.n_errors = n_errors
+
+        return process
+
+
+    def _push_error(self, error: float) -> None:
+        ring = self._err_ring
+        i = self._err_head
+        if self._err_count == len(ring):
+            self._err_sum -= ring[i]
+        else:
+            self._err_count += 1
+        ring[i] = error
+        self._err_sum += error
+        self._err_head = (i + 1) % len(ring)
         
-        self.note = note
-        self.error = error
-        self.error_adj = error_adj
-        self.error_adj_buf.append(error_adj)
         
-        block.note = note
-        block.error = error
-        block.error_adj = error_adj
+    def _clear_errors(self) -> None:
+        self._err_sum = 0.0
+        self._err_head = 0
+        self._err_count = 0
+
+
+
+def test_pitch_estimator():
+
+    fs = 44100
+    t = np.arange(8192) / fs
+    x = (0.3 * np.sin(2 * np.pi * 45 * t)).astype(np.float32)
+
+    # The FFT path must agree with the direct sums, including after `init`
+    # has changed the number of lags (e.g., fmin was lowered).
+    est = PitchEstimator(fs, fmin=200)
+    est.compute_cmndf(x)
+    est._fmin = 40
+    est.init()
+    for _ in range(2):
+        est.method = "fft"
+        d = est.compute_cmndf(x)[0].copy()
+        est.method = "direct"
+        d_direct = est.compute_cmndf(x)[0]
+        assert np.abs(d - d_direct).max() <= 1e-3 * np.abs(d_direct).max()
@@ -1,8 +1,10 @@
+import bisect
 import json
 from typing import (
     Dict,
     Mapping,
     Optional,
+    Tuple,
     Union,
 )
 
@@ -41,13 +43,15 @@ def default_note_names() -> Dict:
 
 class Note:
             
-    # From definition
-    index: Optional[int] = None
-    name: Optional[str] = None
-    cents: Optional[float] = None
-    
-    # From estimation
-    pitch: float = 0.0
+    __slots__ = (
+        # From definition
+        "_index",   # int
+        "_name",    # str
+        "_cents",   # float
+        
+        # From estimation
+        "pitch",    # float
+    )
 
     
     
@@ -55,6 +59,7 @@ class Note:
         self._index = index
         self._name = name
         self._cents = cents
+        self.pitch = 0.0
 
 
     @property
@@ -97,10 +102,15 @@ class Scale:
 
     """
 
-    _scale_name: str
-    _cents: np.ndarray
-    _names: np.ndarray
-    _note_objects: np.ndarray
+    __slots__ = (
+        "_scale_name",      # str
+        "_cents",           # np.ndarray
+        "_bounds",          # Tuple[float, ...]; cents, then 1200 (the next octave's zeroth note)
+        "_names",           # np.ndarray
+        "_name_to_index",   # Dict[str, int]
+        "_note_objects",    # np.ndarray
+        "_uniform_step",    # Optional[float]
+    )
 
     @property
     def scale_name(self) -> str:
@@ -123,6 +133,15 @@ class Scale:
         return self._note_objects
     
     
+    @property
+    def uniform_step(self) -> Optional[float]:
+        """
+        Step size (in cents) if the scale divides the octave into equal steps,
+        otherwise `None`.
+        """
+        return self._uniform_step
+    
+    
     @classmethod
     def from_dict(cls, dct: Mapping) -> "Scale":
         """
@@ -172,6 +191,18 @@ class Scale:
         assert np.all(out._cents >= 0)
         assert np.all(out._cents < 1200)
         
+        # Sorted lookup table for `nearest`.
+        out._cents = np.ascontiguousarray(out._cents, dtype=np.float64)
+        out._bounds = (*out._cents.tolist(), 1200.0)
+        
+        # Equal divisions of the octave get a constant-time note lookup.
+        out._uniform_step = None
+        if len(out._cents) > 1:
+            step = out._cents[1] - out._cents[0]
+            if np.allclose(np.ediff1d(out._cents), step) and \
+                np.isclose(step * len(out._cents), 1200):
+                out._uniform_step = float(step)
+        
         # Make note objects.
         out._note_objects = np.zeros(len(out._cents), dtype=object)
         for i in range(len(out._cents)):
@@ -196,7 +227,32 @@ class Scale:
 
     #-------------------------------------------------------------------------------#
 
+    def nearest(self, cents: float) -> Tuple[int, float]:
+        """
+        Find the note nearest to a position within the octave.
         
+        `cents` is the distance above the zeroth note, in [0, 1200). Returns
+        the index of the nearest note and the signed distance from it (in cents).
+        Positions just below the octave resolve to the zeroth note.
+        """
+        n = len(self._cents)
+        step = self._uniform_step
+        if step is not None:
+            k = round(cents / step)
+            return k % n, cents - k * step
+
+        # Binary search over plain floats; for a single value this is much
+        # cheaper than `np.searchsorted`.
+        bounds = self._bounds
+        i = bisect.bisect_left(bounds, cents)
+        if i == 0:
+            return 0, cents - bounds[0]
+        below = cents - bounds[i - 1]
+        above = cents - bounds[i]
+        if abs(above) < abs(below):
+            return i % n, above
+        return i - 1, below
+
 
     
     #-------------------------------------------------------------------------------#
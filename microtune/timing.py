@@ -1,6 +1,6 @@
 import enum
 from numbers import Number
-from typing import Callable
+from typing import Callable, Optional
 import time
 
 
@@ -67,6 +67,15 @@ class Clock:
     def stopped(self) -> bool:
         return self._state == ClockState.STOPPED
 
+    @property
+    def fn(self) -> Callable[[], Number]:
+        return self._fn
+
+    @property
+    def t_start(self) -> Optional[Number]:
+        """Raw `fn()` value when the clock was started, if it has been."""
+        return self._t_start
+
 
     def reset(self, start: bool = False) -> None:
 
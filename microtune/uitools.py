@@ -1,3 +1,4 @@
+import functools
 import json
 from numbers import Number
 from pathlib import Path
@@ -15,8 +16,7 @@ import numpy as np
 
 from qtpy.QtCore import (
     Signal,
-    QFile,
-    QTextStream,
+    QTimer,
 )
 
 from qtpy.QtGui import (
@@ -37,8 +37,10 @@ from qtpy.QtWidgets import (
     QSpacerItem,
 )
 
-import pyqtgraph as pg
-pg.setConfigOption("antialias", True)
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 __all__ = [
@@ -73,7 +75,7 @@ class BoxLayoutMixin:
             self.add(obj)
 
     def __getitem__(self, index: int) -> Union[QLayoutItem, QWidget]:
-        return self.takeAt(index)
+        return self.itemAt(index)
 
     def __iter__(self) -> Iterator:
         return iteritems(self)
@@ -82,14 +84,81 @@ class BoxLayoutMixin:
         return self.count()
 
 
+class CoalescedUpdateMixin:
+
+    """
+    Defers widget updates to a render timer, dropping stale blocks.
+    
+    `update_ui` (connected to `MainWindow.blockProcessed`) only records the
+    block and arms a single-shot timer. When it fires, the most recent block
+    is drawn via `redraw(block)`; blocks that arrive in the meantime replace
+    it without being drawn. Widgets therefore repaint at most once per
+    `render_interval` (about once per display frame) however fast blocks
+    arrive, and slow repaints can't back up block processing. A block that
+    is re-sent while it's pending, or after it has been drawn, is ignored.
+    
+    Since drawing is deferred, blocks must not share buffers that are
+    reused later (see `Block.detach`). Widgets override `redraw` to do the
+    actual drawing.
+    """
+
+    ignore_update: bool = False
+
+    #: Minimum time between redraws, in milliseconds.
+    render_interval: int = 16
+
+    _render_timer: Optional[QTimer] = None
+
+    _pending_block: Optional["Block"] = None
+
+    #: Block most recently passed to `redraw`.
+    _last_block: Optional["Block"] = None
+
+    #: Number of blocks replaced before they could be drawn.
+    n_dropped: int = 0
+
+
+    def update_ui(self, block: "Block") -> None:
+        if self.ignore_update:
+            return
+        if block is self._pending_block or block is self._last_block:
+            return
+        if self._pending_block is not None:
+            self.n_dropped += 1
+        self._pending_block = block
+        
+        timer = self._render_timer
+        if timer is None:
+            self._render_timer = timer = QTimer(self)
+            timer.setSingleShot(True)
+            timer.timeout.connect(self._flush_update)
+        if not timer.isActive():
+            timer.start(self.render_interval)
+
+
+    def _flush_update(self) -> None:
+        block, self._pending_block = self._pending_block, None
+        if block is not None and not self.ignore_update:
+            self._last_block = block
+            self.redraw(block)
+
+
+    def redraw(self, block: "Block") -> None:
+        """
+        Draw `block`. Does nothing by default; widgets override it. (It
+        isn't an abstract method since `abc` can't be combined with the Qt
+        widget metaclass.)
+        """
+
+
+
 def iteritems(layout: QBoxLayout):
     """
-    Iterate through items in a box layout.
+    Iterate through items in a box layout. The layout is left unchanged.
     """
     N = layout.count()
     for i in range(N):
-        item = layout.takeAt(i)
-        yield item
+        yield layout.itemAt(i)
 
 
 
@@ -131,10 +200,113 @@ class VBoxLayout(QVBoxLayout, BoxLayoutMixin):
 --------------------------------------------------------------------------------
 """
 
-import matplotlib as mpl
+ColorLike = Union[str, Sequence[Number]]
 
 
-ColorLike = Union[str, Sequence[Number]]
+def _color_key(c: ColorLike) -> ColorLike:
+    """
+    Hashable stand-in for a color, used as the conversion cache key.
+    """
+    if isinstance(c, (str, tuple)):
+        return c
+    return tuple(np.asarray(c).tolist())
+
+
+#: Single-letter and basic CSS color names, with the same values matplotlib
+#: gives them. Anything else goes through matplotlib.
+_NAMED_COLORS = {
+    "b": (0.0, 0.0, 1.0),
+    "g": (0.0, 0.5, 0.0),
+    "r": (1.0, 0.0, 0.0),
+    "c": (0.0, 0.75, 0.75),
+    "m": (0.75, 0.0, 0.75),
+    "y": (0.75, 0.75, 0.0),
+    "k": (0.0, 0.0, 0.0),
+    "w": (1.0, 1.0, 1.0),
+    "black": "#000000",
+    "white": "#FFFFFF",
+    "gray": "#808080",
+    "grey": "#808080",
+    "red": "#FF0000",
+    "green": "#008000",
+    "blue": "#0000FF",
+    "cyan": "#00FFFF",
+    "magenta": "#FF00FF",
+    "yellow": "#FFFF00",
+    "orange": "#FFA500",
+}
+
+
+def _parse_hex(c: str) -> Optional[bytes]:
+    """
+    Channel values of a '#rgb', '#rgba', '#rrggbb' or '#rrggbbaa' string,
+    or `None` if `c` isn't one. Parsing is done by `bytes.fromhex`.
+    """
+    if not c.startswith("#"):
+        return None
+    h = c[1:]
+    if len(h) in (3, 4):
+        h = "".join(ch + ch for ch in h)
+    if len(h) not in (6, 8):
+        return None
+    try:
+        b = bytes.fromhex(h)
+    except ValueError:
+        return None
+    # `fromhex` skips whitespace between bytes, which shows up as a short read.
+    return b if 2 * len(b) == len(h) else None
+
+
+def _fast_to_rgba(c: ColorLike, alpha: Optional[Number]) -> Optional[tuple]:
+    """
+    Convert hex strings, the names in `_NAMED_COLORS`, and rgb(a) tuples
+    without going through matplotlib. Returns `None` for anything else.
+    """
+    if isinstance(c, str):
+        c = _NAMED_COLORS.get(c.lower(), c)
+    if isinstance(c, str):
+        b = _parse_hex(c)
+        if b is None:
+            return None
+        vals = [v / 255 for v in b]
+    elif isinstance(c, (tuple, list)) and len(c) in (3, 4):
+        vals = list(c)
+        if not all(isinstance(v, Number) and 0 <= v <= 1 for v in vals):
+            return None
+    else:
+        return None
+
+    if alpha is not None:
+        a = alpha
+    else:
+        a = vals[3] if len(vals) == 4 else 1.0
+    return (float(vals[0]), float(vals[1]), float(vals[2]), float(a))
+
+
+@functools.lru_cache(maxsize=512)
+def _to_rgba(c: ColorLike, alpha: Optional[Number]) -> np.ndarray:
+    rgba = _fast_to_rgba(c, alpha)
+    if rgba is None:
+        import matplotlib.colors
+        rgba = matplotlib.colors.to_rgba(c, alpha=alpha)
+    out = np.array(rgba)
+    out.setflags(write=False)
+    return out
+
+
+@functools.lru_cache(maxsize=512)
+def _to_RGBA(c: ColorLike, alpha: Optional[Number]) -> np.ndarray:
+    # Hex strings already hold the 8-bit values, so skip the round trip
+    # through floats.
+    b = _parse_hex(c) if isinstance(c, str) and alpha is None else None
+    if b is not None:
+        if len(b) == 3:
+            b += b"\xff"
+        out = np.frombuffer(b, dtype=np.uint8)
+    else:
+        out = (255 * _to_rgba(c, alpha)).astype(np.uint8)
+    out.setflags(write=False)
+    return out
 
 
 def to_rgba(
@@ -143,10 +315,10 @@ def to_rgba(
     ) -> np.ndarray:
     """
     floating point, with alpha
+    
+    Conversions are cached, and the (shared) arrays returned are read-only.
     """
-    out = mpl.colors.to_rgba(c, alpha=alpha)
-    out = np.array(out) if isinstance(out, tuple) else out
-    return out
+    return _to_rgba(_color_key(c), alpha)
 
 
 
@@ -169,9 +341,7 @@ def to_RGBA(
     """
     8-bit, with alpha
     """
-    out = to_rgba(c, alpha)
-    out = (255 * out).astype(np.uint8)
-    return out
+    return _to_RGBA(_color_key(c), alpha)
 
 
 def to_RGB(
@@ -189,14 +359,17 @@ def to_RGB(
 
 class Style:
 
+    """
+    Application stylesheet and theme colors.
+    """
 
     def __init__(self):
         self.path = Path(__file__).parent.parent / 'resources' / 'style'
+        qss_path = self.path / 'qstyle.qss'
+        colors_path = self.path / 'colors.json'
 
         # Load 'qstyle.qss'.
-        f = QFile(str(self.path / 'qstyle.qss'))
-        f.open(QFile.ReadOnly | QFile.Text)
-        self._style_sheet = QTextStream(f).readAll()
+        self._style_sheet = qss_path.read_text(encoding='utf-8')
 
         if platform.system().lower() == 'darwin':
             mac_fix = '''
@@ -210,9 +383,8 @@ class Style:
             self._style_sheet += mac_fix
 
         # If theme has a colors.json file, read it. ??
-        self.colors = {}
-        with open(str(self.path / 'colors.json'), 'r') as f:
-            self.colors = json.load(f)
+        data = colors_path.read_bytes()
+        self.colors = orjson.loads(data) if orjson else json.loads(data)
 
 
     @property
@@ -266,6 +438,9 @@ class Application:
     #: Wrapped QApplication.
     _qapp: ClassVar[Optional[QApplication]] = None
 
+    #: Whether `_qapp` has been set up since the last cleanup.
+    _qapp_ready: bool = False
+
     _reusable: bool = False
 
 
@@ -288,8 +463,9 @@ class Application:
         self._reusable = tf
 
 
-    @property
+    @functools.cached_property
     def aboutToQuit(self) -> Signal:
+        # Cached per QApplication; `cleanup` drops it along with the qapp.
         return self._qapp.aboutToQuit
 
 
@@ -297,9 +473,9 @@ class Application:
         return self._qapp
 
 
-    def init_qapp(self):
+    def init_qapp(self) -> QApplication:
 
-        if self._qapp is not None:
+        if self._qapp_ready:
             return self._qapp
 
         # Create the qapp.
@@ -314,6 +490,9 @@ class Application:
         if self._created_qapp:
             qapp.aboutToQuit.connect(qapp.deleteLater)
 
+        self._qapp_ready = True
+        return qapp
+
 
     def exec(self) -> None:
 
@@ -330,6 +509,8 @@ class Application:
 
     def cleanup(self, error: Optional[Exception] = None) -> None:
         self._qapp = None
+        self._qapp_ready = False
+        self.__dict__.pop("aboutToQuit", None)
         if self._reusable:
             self.init_qapp()
         if error:
@@ -1,10 +1,10 @@
+import math
 from pathlib import Path
 from typing import Dict, Optional
 
 import numpy as np
-import scipy.stats
-from qtpy.QtCore import Qt, Slot
-from qtpy.QtGui import QFont
+from qtpy.QtCore import QLocale, Qt, Slot
+from qtpy.QtGui import QDoubleValidator, QFont
 from qtpy.QtWidgets import (
     # main
     QWidget,
@@ -27,9 +27,14 @@ from pyqtgraph.parametertree import (
     ParameterTree,
 )
 
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
+
 from .common import Block, scale_dir
 from .scales import Scale
-from .uitools import HBoxLayout
+from .uitools import CoalescedUpdateMixin, HBoxLayout
 
 
 __all__ = [
@@ -39,11 +44,40 @@ __all__ = [
 ]
 
 
-class InputWidget(QWidget):
+def _float_validator(bottom: float,
+                     top: float,
+                     decimals: int,
+                     parent: QWidget,
+                     ) -> QDoubleValidator:
+    """
+    Validator for plain decimal input that `float()` can always parse
+    (i.e., no locale-specific separators or exponents).
+    """
+    validator = QDoubleValidator(bottom, top, decimals, parent)
+    validator.setNotation(QDoubleValidator.StandardNotation)
+    validator.setLocale(QLocale.c())
+    return validator
+
+
+def _set_text(label: QLabel, text: str, shown: Dict[QLabel, str]) -> None:
+    """
+    Set a label's text unless `shown` says it's already displaying it, which
+    saves Qt a relayout/repaint when a readout hasn't changed.
+    """
+    if shown.get(label) != text:
+        label.setText(text)
+        shown[label] = text
+
+
+
+class InputWidget(QWidget, CoalescedUpdateMixin):
 
 
     instream: "InputStream"
 
+    #: Pitch estimator the stream feeds, if any. Bounds the buffer size.
+    estimator: Optional["PitchEstimator"]
+
     label_widths = 125
     field_widths = 50
     
@@ -52,11 +86,13 @@ class InputWidget(QWidget):
     def __init__(self,
                  instream: "InputStream",
                  parent: Optional[QWidget] = None,
+                 estimator: Optional["PitchEstimator"] = None,
                  ):
         super().__init__(parent=parent)
 
 
         self.instream = instream
+        self.estimator = estimator
 
         # - Controls
 
@@ -72,11 +108,19 @@ class InputWidget(QWidget):
         self.bufsecs_field = bufsecs_field = QLineEdit()
         bufsecs_field.setText('{:.3f}'.format(bufsecs))
         bufsecs_field.setFixedWidth(self.field_widths)
+        bufsecs_field.setValidator(
+            _float_validator(0.001, float("inf"), 3, self))
+        self._update_bufsecs_bottom()
+        # The estimator's lags can change, so refresh the bound while typing.
+        bufsecs_field.textEdited.connect(self._update_bufsecs_bottom)
         bufsecs_field.returnPressed.connect(self.on_bufsecs_field_edited)        
 
-        # - waveform viewer
+        # - waveform viewer (time axis is rebuilt only when the block length
+        #   or sample rate changes)
         X = np.linspace(-bufsecs, 0, bufsize)
         Y = np.zeros(len(X))
+        self._X = X
+        self._X_key = (bufsize, instream.samplerate)
         self.signal_plot = pg.PlotItem()
         self.signal_curve = self.signal_plot.plot(X, Y)
         self.signal_plot.setLabel('bottom', 'time (sec)')
@@ -84,8 +128,8 @@ class InputWidget(QWidget):
         self.signal_plot.setYRange(-0.5, 0.5)
 
         # - RMS indicator
-        X = np.array([0.5])
-        Y = np.array([0])
+        X = self._rms_x = np.array([0.5])
+        Y = self._rms_h = np.zeros(1)
         self.rms_val = 0.0
         self.rms_plot = pg.PlotItem()
         self.rms_bar = pg.BarGraphItem(x=X, width=1, height=Y, brush='r')
@@ -128,50 +172,62 @@ class InputWidget(QWidget):
 
 
     @Slot()
-    def on_bufsecs_field_edited(self) -> None:
+    def _update_bufsecs_bottom(self) -> None:
         """
-        Notify stream of change in requested buffer size.
+        Keep the buffer size field from accepting buffers shorter than the
+        pitch estimator can process.
         """
-        try:
-            secs = float(self.bufsecs_field.text())
-            if secs <= 0:
-                raise ValueError
-        except:
-            print('Warning: Invalid value for buffer size')
+        if self.estimator is None:
             return
+        secs = self.estimator.min_blocksize / self.instream.samplerate
+        bottom = max(math.ceil(secs * 1000) / 1000, 0.001)
+        self.bufsecs_field.validator().setBottom(bottom)
 
+
+    @Slot()
+    def on_bufsecs_field_edited(self) -> None:
+        """
+        Notify stream of change in requested buffer size.
+        
+        The field's validator only lets `returnPressed` through for numbers
+        in range, so the text always parses.
+        """
+        secs = float(self.bufsecs_field.text())
         fs = self.instream.samplerate
         self.instream.bufsize = int(secs * fs)
 
 
-    @Slot(object)
-    def update_ui(self, block: Block) -> None:
+    def redraw(self, block: Block) -> None:
         """
         Update waveform view and RMS indicator.
         """
-        
-        if self.ignore_update:
-            return
-        
+
         data = block.data
         N = len(data)
-        secs = N / block.samplerate
-        X = np.linspace(-secs, 0, N)
-        self.signal_curve.setData(X, data)
-        self.signal_plot.setXRange(-secs, 0)
-        
-        if len(data) > 1:
-        
-            self.rms_val = np.sqrt(np.mean(data**2))
+        key = (N, block.samplerate)
+        if key != self._X_key:
+            secs = N / block.samplerate
+            self._X = np.linspace(-secs, 0, N)
+            self._X_key = key
+            self.signal_plot.setXRange(-secs, 0)
+        self.signal_curve.setData(self._X, data)
+        
+        # The pitch estimator already worked out the RMS while computing the
+        # difference function. Blocks below the volume gate skip it, so only
+        # those need a pass over the data here.
+        if block.dn is not None:
+            self.rms_val = block.rms
+        elif N > 1:
+            self.rms_val = np.sqrt(np.dot(data, data) / N)
         else:
             self.rms_val = 0
-        self.rms_bar.setOpts(x=np.array([0.5]),
-                             height=np.array([self.rms_val]))
+        self._rms_h[0] = self.rms_val
+        self.rms_bar.setOpts(x=self._rms_x, height=self._rms_h)
         self.rms_plot.setXRange(0, 1)
 
             
 
-class PitchWidget(QWidget):
+class PitchWidget(QWidget, CoalescedUpdateMixin):
 
     """
     YIN pitch estimator.
@@ -207,6 +263,8 @@ class PitchWidget(QWidget):
         super().__init__(parent=parent)
         
         self.estimator = estimator
+        self._lags = None
+        self._label_text = {}
 
         # Initialize UI
         layout = QHBoxLayout()
@@ -220,7 +278,7 @@ class PitchWidget(QWidget):
         """
         
         panel_layout = QVBoxLayout()
-        self.layout().addLayout(panel_layout)
+        layout.addLayout(panel_layout)
 
         # - Pitch readout
         self.pitch_label = QLabel('Pitch (Hz):')
@@ -244,20 +302,21 @@ class PitchWidget(QWidget):
         self.param_tree = param_tree = ParameterTree()
         param_tree.setParameters(param_group)
         self.params = {}
+        child = param_group.child
         
-        fmin = param_group.child("fmin")
+        fmin = child("fmin")
         fmin.sigValueChanged.connect(self.on_flim_changed)
         self.params["fmin"] = fmin
         
-        fmax = param_group.child("fmax")
+        fmax = child("fmax")
         fmax.sigValueChanged.connect(self.on_flim_changed)
         self.params["fmax"] = fmax
         
-        min_thresh = param_group.child("min_thresh")
+        min_thresh = child("min_thresh")
         min_thresh.sigValueChanged.connect(self.on_thresh_changed)
         self.params["min_thresh"] = min_thresh
         
-        abs_thresh = param_group.child("abs_thresh")
+        abs_thresh = child("abs_thresh")
         abs_thresh.sigValueChanged.connect(self.on_thresh_changed)
         self.params["abs_thresh"] = abs_thresh
 
@@ -290,6 +349,7 @@ class PitchWidget(QWidget):
         line = pg.InfiniteLine(pos=0, angle=90)
         self.axes.addItem(line)
         self.lines["pitch"] = line
+        self._pitch_line_state = (True, 0)
                 
         line = pg.InfiniteLine(pos=estimator.min_thresh, angle=0)
         self.axes.addItem(line)
@@ -298,10 +358,11 @@ class PitchWidget(QWidget):
         line = pg.InfiniteLine(pos=estimator.abs_thresh, angle=0)
         self.axes.addItem(line)
         self.lines["abs_thresh"] = line
+        self._thresh_line_state = (estimator.min_thresh, estimator.abs_thresh)
         
         # Layout
         self.graphics_layout = graphics_layout = pg.GraphicsLayoutWidget()
-        self.layout().addWidget(graphics_layout)
+        layout.addWidget(graphics_layout)
         graphics_layout.addItem(self.axes)
 
                 
@@ -314,37 +375,54 @@ class PitchWidget(QWidget):
         layout.setStretch(1, 4)
 
 
-    @Slot(object)
-    def update_ui(self, block: Block) -> None:
+    def redraw(self, block: Block) -> None:
         """
+        Update pitch readout and normalized difference function.
         """
-        
-        if self.ignore_update:
-            return
-                
+
         # Update pitch readout label.      
         if block.tunable:
-            s = 'Pitch (Hz): {:.2f}'.format(block.pitch)
+            s = f'Pitch (Hz): {block.pitch:.2f}'
         else:
             s = 'Pitch (Hz):'
-        self.pitch_label.setText(s)
+        _set_text(self.pitch_label, s, self._label_text)
         
-        # Update nmdf curve.        
-        dn_line = self.lines["dn"]
-        lags = np.arange(len(block.dn))
-        dn_line.setData(lags, block.dn)
+        # Update nmdf curve (not computed for blocks below the volume gate).
+        if block.dn is not None:
+            dn_line = self.lines["dn"]
+            dn_line.setData(self._lags_for(len(block.dn)), block.dn)
                 
-        # Update pitch indicator on axes.
-        vline = self.lines["pitch"]
-        vline.setVisible(block.tunable)
-        #vline.setValue(block.pitch)
-        vline.setValue(block.ix_best)
+        # Update pitch indicator on axes. Only changes are pushed to Qt.
+        state = (block.tunable, block.ix_best)
+        if state != self._pitch_line_state:
+            vline = self.lines["pitch"]
+            vline.setVisible(block.tunable)
+            #vline.setValue(block.pitch)
+            vline.setValue(block.ix_best)
+            self._pitch_line_state = state
                     
         # Update threshold indicators on axes.
-        self.lines["min_thresh"].setValue(self.estimator.min_thresh)
-        self.lines["abs_thresh"].setValue(self.estimator.abs_thresh)
+        state = (self.estimator.min_thresh, self.estimator.abs_thresh)
+        if state != self._thresh_line_state:
+            self.lines["min_thresh"].setValue(state[0])
+            self.lines["abs_thresh"].setValue(state[1])
+            self._thresh_line_state = state
         
         
+    def _lags_for(self, n: int) -> np.ndarray:
+        """
+        Lag axis for a difference function of length `n`. Uses the
+        estimator's own lag array when it fits, and otherwise keeps one
+        around until the length changes.
+        """
+        lags = self.estimator.lags
+        if len(lags) == n:
+            return lags
+        if self._lags is None or len(self._lags) != n:
+            self._lags = np.arange(n)
+        return self._lags
+
+
     @Slot()
     def on_flim_changed(self) -> None:
         """
@@ -354,7 +432,7 @@ class PitchWidget(QWidget):
         """
         self.estimator._fmin = self.params["fmin"].value()
         self.estimator._fmax = self.params["fmax"].value()
-        self.estimator.prepare()
+        self.estimator.init()
         
         
     @Slot()
@@ -371,13 +449,16 @@ class PitchWidget(QWidget):
             
             
 
-class IntonationWidget(QWidget):
+class IntonationWidget(QWidget, CoalescedUpdateMixin):
     
     estimator: "IntonationEstimator"
 
     #: Flag to prevent trying to update.
     ignore_update: bool = False
     
+    #: Sign shown before the cents readout, indexed by sign(cents) + 1.
+    _sign_chars = ("", " ", "+")
+
     #: UI specs.
 
     
@@ -422,52 +503,55 @@ class IntonationWidget(QWidget):
     def init_panel(self):
 
         
-        self.panel_layout = QVBoxLayout() # left panel
+        self.panel_layout = panel_layout = QVBoxLayout() # left panel
+        self._label_text = {}
         
         # - readout area
         
-        self.readout_layout = QVBoxLayout()
-        self.panel_layout.addLayout(self.readout_layout)
+        self.readout_layout = readout_layout = QVBoxLayout()
+        panel_layout.addLayout(readout_layout)
         
         self.note_label = QLabel("Note: ")
         self.note_label.setFont(QFont("Courier", 14))
-        self.readout_layout.addWidget(self.note_label)
+        readout_layout.addWidget(self.note_label)
         
         self.cents_label = QLabel("Cents: ")
         self.cents_label.setFont(QFont("Courier", 14))
-        self.readout_layout.addWidget(self.cents_label)
+        readout_layout.addWidget(self.cents_label)
         
         self.pitch_label = QLabel('Pitch (Hz):')
         self.pitch_label.setFont(QFont("Courier", 14))
-        self.readout_layout.addWidget(self.pitch_label)
+        readout_layout.addWidget(self.pitch_label)
         
         self.scale_label = QLabel("Scale: ")
         #self.scale_label.setFont(QFont("Courier", 14))
-        self.readout_layout.addWidget(self.scale_label)
+        readout_layout.addWidget(self.scale_label)
         
         # - control area
         
-        self.control_layout = QFormLayout()
-        self.panel_layout.addLayout(self.control_layout)
+        self.control_layout = control_layout = QFormLayout()
+        panel_layout.addLayout(control_layout)
                 
         self.tn_note_combo = QComboBox()
         self.tn_note_combo.activated.connect(self.on_tn_changed)
-        self.control_layout.addRow(QLabel("Tuning note"), self.tn_note_combo)
+        control_layout.addRow(QLabel("Tuning note"), self.tn_note_combo)
         
         self.tn_pitch_field = QLineEdit("")
+        self.tn_pitch_field.setValidator(
+            _float_validator(1.0, 20000.0, 3, self))
         self.tn_pitch_field.returnPressed.connect(self.on_tn_changed)
-        self.control_layout.addRow(QLabel("Tuning pitch"), self.tn_pitch_field)
+        control_layout.addRow(QLabel("Tuning pitch"), self.tn_pitch_field)
         
         # -- Scale button UI
         self.load_scale_btn = QPushButton('Load Scale')
         self.load_scale_btn.clicked.connect(self.on_load_scale_btn_clicked)
-        self.panel_layout.addWidget(self.load_scale_btn)
+        panel_layout.addWidget(self.load_scale_btn)
 
         # start/stop button
         # - - start button
         self.start_btn = QPushButton('Start')
         self.start_btn.clicked.connect(self.on_start_btn_clicked)
-        self.panel_layout.addWidget(self.start_btn)
+        panel_layout.addWidget(self.start_btn)
         
 
     def init_graphics(self):
@@ -485,10 +569,20 @@ class IntonationWidget(QWidget):
         # - - Vertical line indicating pitch
         self.vline = pg.InfiniteLine(pos=0, angle=90)
         self.axes.addItem(self.vline)
+        self._vline_pos = 0
+        self._graphics_visible = True
 
+        # - - Error distribution. The curve is recomputed in place (see
+        #     `draw_distribution`).
         X = np.linspace(-50, 50, 1000)
         Y = np.zeros_like(X)
-        self.ncurve = self.axes.plot(X, Y)
+        # Only this curve is antialiased; the per-block plots elsewhere are
+        # drawn without it since it's costly and barely visible on them.
+        self.ncurve = self.axes.plot(X, Y, antialias=True)
+        self._gauss_x = X
+        self._gauss_y = Y
+        self._gauss_tmp = np.empty_like(X)
+        self._gauss_params = None
         
         #-----------------------------------------------------------------------
         # - Layout
@@ -504,63 +598,86 @@ class IntonationWidget(QWidget):
     """
 
 
-    @Slot(object)
-    def update_ui(self, block: Block) -> None:
+    def redraw(self, block: Block) -> None:
         """
         Triggered by the pitch estimator when estimation has completed.
         """
-        
-        if self.ignore_update:
-            return
-                                  
+
         # If no pitch was given, clear the display and return.
         if not block.tunable:
             self.clear_readout()
             return
         
+        shown = self._label_text
+
         # - Update note label
         note_name = self.estimator.scale.names[block.note]
-        self.note_label.setText("Note: " + note_name)
+        _set_text(self.note_label, "Note: " + note_name, shown)
         
         # - Update cents label
-        # Round error to nearest half-cent.
-        cents_off = round(block.error * 2) / 2                
-        if cents_off > 0:
-            sign_char = "+"
-        elif cents_off < 0:
-            sign_char = ""            
-        else:
-            sign_char = " "                
-        self.cents_label.setText("Cents: {}{:.1f}".format(sign_char, cents_off))
+        # Round error to nearest half-cent. Negative values carry their own
+        # sign, zero gets a space to keep the digits aligned.
+        cents_off = round(block.error * 2) / 2
+        sign_char = self._sign_chars[(cents_off > 0) - (cents_off < 0) + 1]
+        _set_text(self.cents_label, f"Cents: {sign_char}{cents_off:.1f}", shown)
         
         # - Update pitch label
-        if block.tunable:
-            s = 'Pitch (Hz): {:.2f}'.format(block.pitch)
-        else:
-            s = 'Pitch (Hz):'
-            
-        self.pitch_label.setText(s)        
+        _set_text(self.pitch_label, f'Pitch (Hz): {block.pitch:.2f}', shown)
+
         # - Update graphics.
-        self.vline.setVisible(True)
-        self.vline.setValue(block.error_adj)
-        self.ncurve.setVisible(True)
-        errors = np.array(self.estimator.error_buf)
-        n_samples = len(errors)
+        if not self._graphics_visible:
+            self.vline.setVisible(True)
+            self.ncurve.setVisible(True)
+            self._graphics_visible = True
+        if block.error_adj != self._vline_pos:
+            self.vline.setValue(block.error_adj)
+            self._vline_pos = block.error_adj
+        # Statistics of the errors as of this block (the estimator may have
+        # moved on by the time it's drawn).
+        n_samples = block.n_errors
 
         if n_samples > 1:
-            mu = np.mean(errors)
-            std = np.std(errors)            
+            mu = block.error_adj
+            std = block.error_std
             #sem = std / np.sqrt(n_samples)
             #sigma = 1.96 * sem
             sigma = max(std, 0.001)
 
-            X = np.linspace(-50, 50, 1000)
             height = max(1.0 - sigma * 0.1, 0)
-            
-            Y = height * np.exp(-(X-mu)**2/(2*sigma**2))
             #Y = scipy.stats.t.pdf(X, n_samples-1, loc=mu, scale=sigma)
+            self.draw_distribution(mu, sigma, height)
+
+
+    def draw_distribution(self, mu: float, sigma: float, height: float) -> None:
+        """
+        Draw `height * exp(-(x - mu)**2 / (2 * sigma**2))` over the cents axis,
+        reusing the curve's buffers. Skipped if the parameters are unchanged.
+        
+        Evaluated in a single pass with numexpr when it's installed, and with
+        in-place numpy operations otherwise.
+        """
+        params = (mu, sigma, height)
+        if params == self._gauss_params:
+            return
+        self._gauss_params = params
+        
+        Y = self._gauss_y
+        if numexpr is not None:
+            numexpr.evaluate(
+                "height * exp(-(X - mu)**2 / (2 * sigma**2))",
+                local_dict=dict(X=self._gauss_x, mu=mu, sigma=sigma, height=height),
+                out=Y,
+            )
+            self.ncurve.setData(self._gauss_x, Y)
+            return
 
-            self.ncurve.setData(X, Y)
+        tmp = self._gauss_tmp
+        np.subtract(self._gauss_x, mu, out=tmp)
+        np.multiply(tmp, tmp, out=tmp)
+        np.multiply(tmp, -0.5 / (sigma * sigma), out=tmp)
+        np.exp(tmp, out=Y)
+        np.multiply(Y, height, out=Y)
+        self.ncurve.setData(self._gauss_x, Y)
 
 
     @Slot()
@@ -570,11 +687,14 @@ class IntonationWidget(QWidget):
 
     def clear_readout(self):
 
-        self.note_label.setText("Note: ")
-        self.cents_label.setText("Cents: ")
-        self.pitch_label.setText("Pitch (Hz): ")
-        self.vline.setVisible(False)
-        self.ncurve.setVisible(False)
+        shown = self._label_text
+        _set_text(self.note_label, "Note: ", shown)
+        _set_text(self.cents_label, "Cents: ", shown)
+        _set_text(self.pitch_label, "Pitch (Hz): ", shown)
+        if self._graphics_visible:
+            self.vline.setVisible(False)
+            self.ncurve.setVisible(False)
+            self._graphics_visible = False
 
 
     @Slot()
@@ -612,8 +732,7 @@ class IntonationWidget(QWidget):
         else:
             self.tn_note_combo.setCurrentIndex(0)            
         
-        self.estimator.scale = new_scale 
-        self.estimator.tn_note = self.tn_note_combo.currentIndex()
+        self.estimator.set_scale(new_scale, self.tn_note_combo.currentIndex())
 
         self.ignore_update = False
         
@@ -624,9 +743,10 @@ class IntonationWidget(QWidget):
         
         # Grab values from widget.
         tn_note = self.tn_note_combo.currentIndex()
-        tn_pitch = float(self.tn_pitch_field.text())
-        
-        # Notify estimator of new values.
         self.estimator.tn_note = tn_note
-        self.estimator.tn_pitch = tn_pitch
+
+        # Also called when the tuning note changes, in which case the pitch
+        # field may be mid-edit. Only take its value once it's valid.
+        if self.tn_pitch_field.hasAcceptableInput():
+            self.estimator.tn_pitch = float(self.tn_pitch_field.text())
         